@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Columns analytics reads from the result store; response text is never loaded
+ANALYTICS_COLUMNS = [
+    'model', 'current_date', 'run_id', 'prompt_index', 'run', 'time_seconds', 'error_type',
+    'response_chars', 'ttft_seconds', 'tokens_per_second', 'cache_hit', 'hedged', 'samples'
+]
+
+# Rows of one n-completion call share its latency; these identify the call
+CALL_COLUMNS = ['run_id', 'model', 'prompt_index', 'samples', 'time_seconds']
+
+LATENCY_QUANTILES = [0.5, 0.9, 0.95, 0.99]
+
+# Response length histogram bin edges, in characters
+LENGTH_BINS = [0, 100, 250, 500, 1000, 2000, 4000, 8000, np.inf]
+
+def _latency_table(df, keys):
+    """Per-group call counts, error and hedge rates and latency percentiles of successful calls.
+
+    Latency figures count each model call once, however many samples it returned.
+    """
+    grouped = df.groupby(keys, observed=True)
+    summary = pd.DataFrame({
+        'calls': grouped.size(),
+        'error_rate': grouped['is_error'].mean(),
+        'hedge_rate': grouped['is_hedged'].mean(),
+    })
+    ok = df[~df['is_error']]
+    if not ok.empty:
+        calls = ok[ok['is_call']].groupby(keys, observed=True)['time_seconds']
+        quantiles = calls.quantile(LATENCY_QUANTILES).unstack()
+        quantiles.columns = [f"p{int(q * 100)}_s" for q in quantiles.columns]
+        ok_grouped = ok.groupby(keys, observed=True)
+        summary = summary.join(quantiles).join(pd.DataFrame({
+            'mean_s': calls.mean(),
+            'ttft_p50_s': ok_grouped['ttft_seconds'].median(),
+            'tokens_per_s': ok_grouped['tokens_per_second'].median(),
+            'chars_p50': ok_grouped['response_chars'].median(),
+            'chars_mean': ok_grouped['response_chars'].mean(),
+        }))
+    return summary.reset_index()
+
+def compute_analytics(df):
+    """Aggregate a result frame (ANALYTICS_COLUMNS) into the analytics tables.
+
+    Everything is a vectorized groupby over the columnar data. Cache hits
+    are excluded from latency figures since they didn't call the model.
+    """
+    if df is None or df.empty:
+        return None
+    df = df.copy()
+    df['is_error'] = df['error_type'].notna()
+    # Hedged calls' latency already runs from the first request; results from before hedging have no flag
+    df['is_hedged'] = df['hedged'].fillna(False).astype(bool) if 'hedged' in df.columns else False
+    if 'cache_hit' in df.columns:
+        df = df[df['cache_hit'] != True]
+    # Results from before the samples column came from one call each
+    df['samples'] = df['samples'].fillna(1).astype(int) if 'samples' in df.columns else 1
+    df['is_shared'] = df['samples'] > 1
+    df['is_call'] = ~df['is_shared'] | ~df.duplicated([column for column in CALL_COLUMNS if column in df.columns])
+    for column in ('model', 'current_date'):
+        df[column] = df[column].astype('category')
+
+    per_model = _latency_table(df, ['model'])
+    per_date = _latency_table(df, ['current_date', 'model'])
+
+    errors_by_type = (
+        df[df['is_error']].groupby(['model', 'error_type'], observed=True).size()
+        .unstack(fill_value=0)
+    )
+
+    ok = df[~df['is_error']]
+    length_bins = pd.cut(ok['response_chars'], LENGTH_BINS, right=False)
+    length_histogram = (
+        ok.groupby(['model', length_bins], observed=False).size()
+        .unstack('model', fill_value=0)
+    )
+    length_histogram.index = length_histogram.index.astype(str)
+
+    # Run-to-run variance: spread across repeated runs of the same (model, prompt) within one sweep;
+    # prompt indexes of different sweeps refer to different prompt sets. Runs answered by one
+    # n-completion call share its latency, so they say nothing about run-to-run variance.
+    separate = ok[~ok['is_shared']]
+    cells = separate.groupby([separate['run_id'].fillna(''), 'model', 'prompt_index'], observed=True)
+    spread = pd.DataFrame({
+        'runs': cells.size(),
+        'latency_std_s': cells['time_seconds'].std(),
+        'chars_std': cells['response_chars'].std(),
+    })
+    repeated = spread[spread['runs'] > 1]
+    run_variance = repeated.groupby(level='model', observed=True).agg(
+        prompts=('runs', 'size'),
+        latency_std_s=('latency_std_s', 'mean'),
+        chars_std=('chars_std', 'mean'),
+    ).reset_index()
+
+    return {
+        'per_model': per_model,
+        'per_date': per_date,
+        'errors_by_type': errors_by_type,
+        'length_histogram': length_histogram,
+        'run_variance': run_variance,
+    }
@@ -0,0 +1,397 @@
+"""Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Latency, error rates and streaming speed are configurable so the sweep
+pipeline can be exercised without calling (or paying) real providers:
+
+    python benchmarks/fake_provider.py --port 8787 --latency 0.8 --error-rate 0.02
+
+Point any model at it with ChatOpenAI(base_url="http://127.0.0.1:8787/v1", api_key="fake").
+It also serves mock OpenAI Batch (files + batches) and Anthropic Message
+Batches endpoints; ChatAnthropic(base_url="http://127.0.0.1:8787") reaches
+the latter. Batches finish --batch-delay seconds after they are created.
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONFIG = {
+    # Lognormal time to first token: median seconds and sigma
+    "latency": 0.5,
+    "latency_sigma": 0.5,
+    # Share of requests that stall for stall_seconds first, as a stuck upstream would
+    "stall_rate": 0.0,
+    "stall_seconds": 30.0,
+    # Share of requests answered with 429 (with Retry-After) and with 500
+    "rate_limit_rate": 0.0,
+    "error_rate": 0.0,
+    "retry_after": 1,
+    # Generation speed and response length
+    "tokens_per_second": 80.0,
+    "response_tokens": 60,
+    # Seconds until a submitted batch has finished
+    "batch_delay": 2.0,
+}
+
+def _response_words(config):
+    return [f"word{i}" for i in range(config["response_tokens"])]
+
+def _prompt_tokens(request):
+    return sum(len(str(message.get("content", ""))) // 4 for message in request.get("messages", []))
+
+def _usage(request, words):
+    samples = int(request.get("n") or 1)
+    prompt_tokens = _prompt_tokens(request)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(words) * samples,
+        "total_tokens": prompt_tokens + len(words) * samples,
+    }
+
+def _chat_completion_body(completion_id, model, words, request):
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": index,
+            "message": {"role": "assistant", "content": " ".join(words)},
+            "finish_reason": "stop",
+        } for index in range(int(request.get("n") or 1))],
+        "usage": _usage(request, words),
+    }
+
+def _multipart_file(content_type, body):
+    """Content of the file part of a multipart/form-data upload"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    for part in message.iter_parts():
+        if part.get_filename():
+            return part.get_filename(), part.get_payload(decode=True)
+    raise ValueError("No file in upload")
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, status, body, content_type="application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _roll_failure(self):
+        """Draw a simulated failure: (status, error payload, headers) or None"""
+        config = self.server.config
+        roll = random.random()
+        if roll < config["rate_limit_rate"]:
+            self.server.count("rate_limited")
+            return 429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, {"Retry-After": str(config["retry_after"])}
+        if roll < config["rate_limit_rate"] + config["error_rate"]:
+            self.server.count("errors")
+            return 500, {"error": {"message": "Internal server error", "type": "server_error"}}, {}
+        return None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.server.count("requests")
+        path = self.path.split("?")[0].rstrip("/")
+
+        if path.endswith("/chat/completions"):
+            self._chat_completion(json.loads(body or b"{}"))
+        elif path.endswith("/v1/files"):
+            self._send_json(200, self.server.store_file(_multipart_file(self.headers["Content-Type"], body)))
+        elif path.endswith("/v1/batches"):
+            request = json.loads(body or b"{}")
+            self._send_json(200, self.server.create_openai_batch(request["input_file_id"], request.get("endpoint")))
+        elif path.endswith("/v1/messages/batches"):
+            self._send_json(200, self.server.create_anthropic_batch(json.loads(body or b"{}")["requests"]))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_GET(self):
+        self.server.count("requests")
+        parts = self.path.split("?")[0].strip("/").split("/")
+        server = self.server
+        if parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in server.batches:
+            self._send_json(200, server.openai_batch(parts[2]))
+        elif parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content" and parts[2] in server.files:
+            self._send_bytes(200, server.files[parts[2]]["content"])
+        elif parts[:3] == ["v1", "messages", "batches"] and len(parts) >= 4 and parts[3] in server.batches:
+            if len(parts) == 5 and parts[4] == "results":
+                self._send_bytes(200, server.anthropic_results(parts[3]), "application/x-jsonl")
+            else:
+                self._send_json(200, server.anthropic_batch(parts[3], self.headers.get("Host")))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _chat_completion(self, request):
+        config = self.server.config
+        time.sleep(random.lognormvariate(0, config["latency_sigma"]) * config["latency"])
+        if random.random() < config["stall_rate"]:
+            time.sleep(config["stall_seconds"])
+
+        failure = self._roll_failure()
+        if failure is not None:
+            self._send_json(*failure)
+            return
+
+        model = request.get("model", "fake-model")
+        words = _response_words(config)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if request.get("stream"):
+            self._stream(completion_id, model, words, _usage(request, words), request)
+        else:
+            time.sleep(len(words) / config["tokens_per_second"])
+            self._send_json(200, _chat_completion_body(completion_id, model, words, request))
+
+    def _stream(self, completion_id, model, words, usage, request):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            return json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            })
+
+        delay = 1.0 / self.server.config["tokens_per_second"]
+        for i, word in enumerate(words):
+            send_event(chunk({"role": "assistant", "content": word if i == 0 else f" {word}"}))
+            time.sleep(delay)
+        send_event(chunk({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send_event(json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            }))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+class FakeProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeProviderHandler)
+        self.config = {**DEFAULT_CONFIG, **config}
+        self.counters = {"requests": 0, "rate_limited": 0, "errors": 0}
+        self.files = {}
+        self.batches = {}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on requests they stopped waiting for (deadlines, hedging)
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def store_file(self, upload):
+        filename, content = upload
+        file_id = f"file-{uuid.uuid4().hex}"
+        self.files[file_id] = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": "batch",
+            "status": "processed",
+            "content": content,
+        }
+        return {key: value for key, value in self.files[file_id].items() if key != "content"}
+
+    def _answer(self, custom_id, request):
+        """Simulated outcome of one batched request: (custom_id, request, failure or None)"""
+        roll = random.random()
+        if roll < self.config["error_rate"]:
+            self.count("errors")
+            return custom_id, request, "Internal server error"
+        return custom_id, request, None
+
+    def _create_batch(self, kind, requests):
+        batch_id = f"batch_{uuid.uuid4().hex}" if kind == "openai" else f"msgbatch_{uuid.uuid4().hex}"
+        answers = [self._answer(custom_id, request) for custom_id, request in requests]
+        with self._lock:
+            self.batches[batch_id] = {"kind": kind, "created_at": time.time(), "answers": answers}
+        return batch_id
+
+    def _ended(self, batch):
+        return time.time() - batch["created_at"] >= self.config["batch_delay"]
+
+    def create_openai_batch(self, input_file_id, endpoint):
+        lines = self.files[input_file_id]["content"].decode().splitlines()
+        requests = [(entry["custom_id"], entry["body"]) for entry in map(json.loads, filter(None, lines))]
+        batch_id = self._create_batch("openai", requests)
+        self.batches[batch_id].update(input_file_id=input_file_id, endpoint=endpoint)
+        return self.openai_batch(batch_id)
+
+    def openai_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        if self._ended(batch) and "output_file_id" not in batch:
+            outputs, errors = [], []
+            for custom_id, request, failure in batch["answers"]:
+                if failure is None:
+                    body = _chat_completion_body(f"chatcmpl-{uuid.uuid4().hex}", request.get("model"),
+                                                 _response_words(self.config), request)
+                    outputs.append({"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": custom_id,
+                                    "response": {"status_code": 200, "body": body}, "error": None})
+                else:
+                    errors.append({"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": custom_id,
+                                   "response": {"status_code": 500, "body": {"error": {"message": failure, "type": "server_error"}}},
+                                   "error": None})
+            for key, entries in (("output_file_id", outputs), ("error_file_id", errors)):
+                content = "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+                batch[key] = self.store_file((f"{batch_id}-{key}.jsonl", content))["id"] if entries else None
+        ended = "output_file_id" in batch
+        failed = sum(failure is not None for _, _, failure in batch["answers"])
+        return {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": batch.get("endpoint"),
+            "input_file_id": batch.get("input_file_id"),
+            "completion_window": "24h",
+            "status": "completed" if ended else "in_progress",
+            "created_at": int(batch["created_at"]),
+            "output_file_id": batch.get("output_file_id"),
+            "error_file_id": batch.get("error_file_id"),
+            "request_counts": {
+                "total": len(batch["answers"]),
+                "completed": len(batch["answers"]) - failed if ended else 0,
+                "failed": failed if ended else 0,
+            },
+        }
+
+    def create_anthropic_batch(self, requests):
+        batch_id = self._create_batch("anthropic", [(entry["custom_id"], entry["params"]) for entry in requests])
+        return self.anthropic_batch(batch_id)
+
+    def anthropic_batch(self, batch_id, host=None):
+        batch = self.batches[batch_id]
+        ended = self._ended(batch)
+        failed = sum(failure is not None for _, _, failure in batch["answers"])
+        created = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(batch["created_at"]))
+        host = host or "%s:%s" % self.server_address[:2]
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else len(batch["answers"]),
+                "succeeded": len(batch["answers"]) - failed if ended else 0,
+                "errored": failed if ended else 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": created,
+            "expires_at": created,
+            "ended_at": created if ended else None,
+            "cancel_initiated_at": None,
+            "archived_at": None,
+            "results_url": f"http://{host}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def anthropic_results(self, batch_id):
+        lines = []
+        for custom_id, request, failure in self.batches[batch_id]["answers"]:
+            if failure is None:
+                words = _response_words(self.config)
+                result = {"type": "succeeded", "message": {
+                    "id": f"msg_{uuid.uuid4().hex}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": request.get("model"),
+                    "content": [{"type": "text", "text": " ".join(words)}],
+                    "stop_reason": "end_turn",
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": _prompt_tokens(request), "output_tokens": len(words)},
+                }}
+            else:
+                result = {"type": "errored", "error": {"type": "error", "error": {"type": "api_error", "message": failure}}}
+            lines.append(json.dumps({"custom_id": custom_id, "result": result}) + "\n")
+        return "".join(lines).encode()
+
+def start_fake_provider(config=None, host="127.0.0.1", port=0):
+    """Serve a fake provider from a background thread; returns the server"""
+    server = FakeProviderServer((host, port), config or {})
+    threading.Thread(target=server.serve_forever, name="fake-provider", daemon=True).start()
+    return server
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"], help="Median seconds to first token")
+    parser.add_argument("--latency-sigma", type=float, default=DEFAULT_CONFIG["latency_sigma"], help="Lognormal sigma of the latency")
+    parser.add_argument("--stall-rate", type=float, default=DEFAULT_CONFIG["stall_rate"], help="Share of requests that stall")
+    parser.add_argument("--stall-seconds", type=float, default=DEFAULT_CONFIG["stall_seconds"], help="Seconds a stalled request waits")
+    parser.add_argument("--rate-limit-rate", type=float, default=DEFAULT_CONFIG["rate_limit_rate"], help="Share of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_CONFIG["error_rate"], help="Share of requests answered with 500")
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULT_CONFIG["tokens_per_second"], help="Generation speed")
+    parser.add_argument("--response-tokens", type=int, default=DEFAULT_CONFIG["response_tokens"], help="Tokens per response")
+    parser.add_argument("--batch-delay", type=float, default=DEFAULT_CONFIG["batch_delay"], help="Seconds until a batch finishes")
+
+def config_from_args(args):
+    return {
+        "latency": args.latency,
+        "latency_sigma": args.latency_sigma,
+        "stall_rate": args.stall_rate,
+        "stall_seconds": args.stall_seconds,
+        "rate_limit_rate": args.rate_limit_rate,
+        "error_rate": args.error_rate,
+        "tokens_per_second": args.tokens_per_second,
+        "response_tokens": args.response_tokens,
+        "batch_delay": args.batch_delay,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI-compatible chat endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    server = FakeProviderServer((args.host, args.port), config_from_args(args))
+    print(f"Fake provider listening on {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,177 @@
+"""Offline throughput benchmark for the sweep pipeline.
+
+Runs executor -> apply_model_async -> journal/result_store -> Firestore
+writer against a local fake provider (benchmarks/fake_provider.py) for
+prompt sets of several sizes and reports calls/sec, call latency
+percentiles, peak memory (max RSS) and storage write counts.
+
+Firestore writes go to the local emulator when FIRESTORE_EMULATOR_HOST is
+set, and are otherwise counted by an in-memory sink.
+
+    python benchmarks/pipeline_benchmark.py --sizes 100 1000 --latency 0.3 --error-rate 0.01
+"""
+import argparse
+import io
+import os
+import resource
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+import pandas as pd
+
+import rate_limit
+from executor import build_work_items, run_sweep
+from fake_provider import add_config_arguments, config_from_args, start_fake_provider
+from firebase_config import FirestoreBatchWriter
+from jobs import build_firestore_document
+from journal import RunJournal
+from prompt_store import ingest_prompt_file
+from utils import MODEL_PROVIDERS, MODEL_REGISTRY
+
+class _CountingBatch:
+    def __init__(self, sink):
+        self.sink = sink
+        self.size = 0
+
+    def set(self, reference, data):
+        self.size += 1
+
+    def commit(self):
+        self.sink.documents += self.size
+
+class CountingFirestoreSink:
+    """Accepts FirestoreBatchWriter traffic and only counts it"""
+
+    def __init__(self):
+        self.documents = 0
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id=None):
+        return doc_id
+
+    def batch(self):
+        return _CountingBatch(self)
+
+def _firestore_client():
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        from firebase_config import initialize_firebase
+        from firebase_admin import firestore
+        initialize_firebase()
+        return firestore.client()
+    return CountingFirestoreSink()
+
+def _fake_models(model_names, base_url):
+    from langchain_openai import ChatOpenAI
+    return {
+        name: ChatOpenAI(
+            model=MODEL_REGISTRY[name][3],
+            base_url=base_url,
+            api_key="fake",
+            max_retries=0,
+            stream_usage=True
+        )
+        for name in model_names
+    }
+
+def benchmark_size(size, model_names, base_url, args):
+    prompts_df = pd.DataFrame({'Prompt': [f"Benchmark prompt {i}: describe item {i}." for i in range(size)]})
+    models = _fake_models(model_names, base_url)
+    prompt_set = ingest_prompt_file(io.BytesIO(prompts_df.to_csv(index=False).encode()))
+    journal = RunJournal.create(prompt_set['set_id'], model_names, args.run_count)
+    writer = FirestoreBatchWriter(client=_firestore_client())
+    work_items = build_work_items(prompts_df, model_names, args.run_count)
+
+    latencies = []
+    ttfts = []
+    errors = 0
+    hedged = 0
+
+    def on_result(result, done, total):
+        nonlocal errors, hedged
+        journal.append(result)
+        writer.add(build_firestore_document(result))
+        latencies.append(result['time_seconds'])
+        if result['ttft_seconds'] is not None:
+            ttfts.append(result['ttft_seconds'])
+        if result['error_type'] is not None:
+            errors += 1
+        hedged += bool(result['hedged'])
+
+    limits = {provider: args.max_in_flight for provider in MODEL_PROVIDERS.values()}
+    start = time.perf_counter()
+    run_sweep(models, work_items, on_result, limits, collect=False, stream=args.stream,
+              multi_sample=not args.single_sample, hedge=args.hedge)
+    sweep_seconds = time.perf_counter() - start
+    writer.close()
+    journal.finalize()
+    total_seconds = time.perf_counter() - start
+    # High-water mark of the whole process so far; sizes run smallest first
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    parquet_files = sum(
+        name.endswith('.parquet')
+        for _, _, names in os.walk(os.path.join('data', 'results'))
+        for name in names
+    )
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0, 0, 0)
+    return {
+        'prompts': size,
+        'calls': len(work_items),
+        'errors': errors,
+        'hedged': hedged,
+        'calls_per_sec': len(work_items) / sweep_seconds,
+        'p50_s': p50,
+        'p95_s': p95,
+        'p99_s': p99,
+        'ttft_p50_s': float(np.percentile(ttfts, 50)) if ttfts else None,
+        'wall_s': total_seconds,
+        'peak_rss_mb': peak_rss_mb,
+        'journal_lines': len(latencies),
+        'parquet_files': parquet_files,
+        'firestore_docs': writer.documents_written,
+        'firestore_rpcs': writer.write_rpcs,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sweep pipeline against a fake provider")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="Prompt set sizes")
+    parser.add_argument("--models", nargs="+", default=list(MODEL_REGISTRY), choices=list(MODEL_REGISTRY))
+    parser.add_argument("--run-count", type=int, default=1)
+    parser.add_argument("--max-in-flight", type=int, default=16, help="Concurrency ceiling per provider")
+    parser.add_argument("--stream", action="store_true", help="Use streaming mode")
+    parser.add_argument("--hedge", action="store_true", help="Hedge requests slower than the recent p95 latency")
+    parser.add_argument("--single-sample", action="store_true", help="Send one request per run instead of n completions per call")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    # The fake provider has no quotas; lift the budgets so they don't cap throughput
+    for provider in set(MODEL_PROVIDERS.values()):
+        rate_limit.PROVIDER_LIMITS[provider] = {"rpm": 10 ** 7, "tpm": 10 ** 9, "max_concurrency": args.max_in_flight}
+
+    server = start_fake_provider(config_from_args(args))
+    rows = []
+    try:
+        for size in sorted(args.sizes):
+            with tempfile.TemporaryDirectory() as workdir:
+                cwd = os.getcwd()
+                os.chdir(workdir)
+                try:
+                    rows.append(benchmark_size(size, args.models, server.base_url, args))
+                finally:
+                    os.chdir(cwd)
+    finally:
+        server.shutdown()
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    print(f"fake provider: {server.counters}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure cold-start cost of importing utils with lazy provider loading.
+
+Each measurement runs in a fresh interpreter. "eager" additionally imports
+every provider SDK, reproducing what importing utils used to cost; "first
+model" builds a single client through the registry, as selecting one model
+in the app does.
+
+    python benchmarks/startup_benchmark.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from utils import MODEL_REGISTRY, PROVIDER_API_KEYS
+
+SCENARIOS = {
+    "lazy": "import utils",
+    "eager": "import utils; " + "; ".join(
+        f"import {module}" for module in sorted({entry[1] for entry in MODEL_REGISTRY.values()})
+    ),
+}
+
+def _fake_keys_env():
+    env = dict(os.environ)
+    for env_var, _ in PROVIDER_API_KEYS.values():
+        env.setdefault(env_var, "benchmark-placeholder-key")
+    return env
+
+def time_snippet(snippet, repeat, env=None):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", snippet], cwd=REPO_ROOT, env=env, capture_output=True)
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            return None, completed.stderr.decode().strip().splitlines()[-1]
+        timings.append(elapsed)
+    return timings, None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per scenario")
+    parser.add_argument("--model", default="gpt-4o-mini", choices=list(MODEL_REGISTRY), help="Model for the first-model scenario")
+    args = parser.parse_args()
+
+    scenarios = dict(SCENARIOS)
+    scenarios[f"first model ({args.model})"] = f"import utils; utils.get_model({args.model!r})"
+
+    print(f"{'scenario':<32} {'median s':>10} {'min s':>10}")
+    for name, snippet in scenarios.items():
+        timings, error = time_snippet(snippet, args.repeat, _fake_keys_env())
+        if timings is None:
+            print(f"{name:<32} skipped: {error}")
+            continue
+        print(f"{name:<32} {statistics.median(timings):>10.3f} {min(timings):>10.3f}")
+
+if __name__ == "__main__":
+    main()
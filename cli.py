@@ -0,0 +1,175 @@
+"""Run sweeps without the Streamlit app, e.g. nightly from cron or spread over several machines.
+
+    python cli.py run --prompts prompts.csv --models gpt-4o-mini claude-sonnet --run-count 3
+
+Each shard of a sweep runs the prompts that hash into it, so shards can run
+anywhere as long as they get the same prompt file, models and run id:
+
+    python cli.py run --prompts prompts.csv --models llama deepseek --run-id nightly-20261017 --shard 2/4 --out shards/
+    python cli.py merge shards/
+
+Every result is journaled as it arrives; running the same command again
+resumes the run, retrying only cells that failed or never finished. Without
+--out a run (or shard) is written straight into this machine's result
+store; with --out it is written to a standalone Parquet file for `merge`,
+which keeps one result per cell however the shard outputs overlap.
+"""
+import argparse
+import hashlib
+import os
+import sys
+from datetime import datetime
+
+from executor import build_work_items, cell_id, parse_shard, run_sweep
+from jobs import build_firestore_document, build_sweep_options
+from journal import RunJournal
+from progress_bus import ProgressBus
+from prompt_store import ingest_prompt_file
+from result_store import compact, merge_result_files
+from storage import get_storage
+from tracing import set_run, span
+from utils import MODEL_PROVIDERS, MODEL_REGISTRY, initialize_models
+
+# Seconds between progress lines
+PROGRESS_INTERVAL_SECONDS = 10.0
+
+def default_run_id(set_id, models, run_count):
+    """Run id shared by every shard started on the same day with the same prompts, models and run count"""
+    config = hashlib.sha1(f"{set_id}|{','.join(models)}|{run_count}".encode()).hexdigest()[:10]
+    return f"sweep-{datetime.now().strftime('%Y%m%d')}-{config}"
+
+def _open_journal(prompt_set, args, shard):
+    sweep_id = args.run_id or default_run_id(prompt_set['set_id'], args.models, args.run_count)
+    journal_id = f"{sweep_id}-shard{shard[0]}of{shard[1]}" if shard else sweep_id
+    journal = RunJournal(journal_id)
+    if not os.path.exists(journal.manifest_path):
+        return RunJournal.create(
+            prompt_set['set_id'], args.models, args.run_count, run_id=journal_id, shard=shard, sweep_id=sweep_id
+        ), sweep_id
+    manifest = journal.manifest()
+    if (manifest['prompt_set'], manifest['models'], manifest['run_count']) != (prompt_set['set_id'], args.models, args.run_count):
+        raise SystemExit(f"Run {journal_id} already exists with different prompts, models or run count")
+    print(f"Resuming run {journal_id}", file=sys.stderr)
+    return journal, sweep_id
+
+def _print_progress(update):
+    for line in update['lines']:
+        print(line, file=sys.stderr)
+    print(f"{update['done']}/{update['total']} cells done", file=sys.stderr)
+
+def run(args):
+    with open(args.prompts, 'rb') as f:
+        prompt_set = ingest_prompt_file(f, name=os.path.basename(args.prompts))
+    journal, sweep_id = _open_journal(prompt_set, args, args.shard)
+    completed = journal.completed_cells()
+    work_items = [
+        item for item in build_work_items(journal.load_prompts(), args.models, args.run_count, args.shard)
+        if cell_id(item) not in completed
+    ]
+    models = initialize_models(args.models)
+
+    writer = None
+    store_problem = None
+    if args.records:
+        store = get_storage()
+        healthy, health_message = store.health(ttl=0)
+        if healthy:
+            writer = store.writer()
+        else:
+            store_problem = f"Record store '{store.name}' unavailable, results not recorded there: {health_message}"
+            print(store_problem, file=sys.stderr)
+    failed = 0
+
+    def on_result(result, done, total):
+        nonlocal failed
+        journal.append(result)
+        if writer is not None:
+            writer.add(build_firestore_document(result, sweep_id))
+        failed += result['error_type'] is not None
+
+    options = {
+        'stream': args.stream,
+        'multi_sample': not args.single_sample,
+        'hedge': args.hedge,
+        'use_cache': args.use_cache,
+        'only_missing': args.only_missing,
+    }
+    limits = {provider: args.max_in_flight for provider in MODEL_PROVIDERS.values()} if args.max_in_flight else None
+    bus = ProgressBus(args.progress_interval)
+    bus.subscribe(_print_progress)
+    print(f"Run {journal.run_id}: {len(work_items)} cells to go ({len(completed)} already done)", file=sys.stderr)
+
+    set_run(journal.run_id)
+    try:
+        with span("job", cli=True):
+            if work_items:
+                run_sweep(models, work_items, on_result, limits, collect=False, bus=bus, **build_sweep_options(options))
+    finally:
+        bus.close()
+        journal.close()
+        if writer is not None:
+            writer.close()
+        set_run(None)
+
+    if args.out:
+        path = os.path.join(args.out, f"{journal.run_id}.parquet")
+        cells = journal.export(path, sweep_id)
+        print(f"Wrote {cells} cells of sweep {sweep_id} to {path}")
+    else:
+        cells = journal.finalize()
+        print(f"Stored {cells} cells of sweep {sweep_id}")
+    if writer is not None and writer.errors:
+        print(f"Record store errors: {'; '.join(writer.errors)}", file=sys.stderr)
+    if store_problem:
+        print(f"{store_problem} (pass --no-records to run without it)", file=sys.stderr)
+    if failed:
+        print(f"{failed} calls failed; run the same command again to retry them", file=sys.stderr)
+        return 1
+    return 1 if store_problem or (writer is not None and writer.errors) else 0
+
+def merge(args):
+    paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            paths.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.parquet')))
+        else:
+            paths.append(path)
+    written = merge_result_files(paths)
+    print(f"Merged {written} new results from {len(paths)} files")
+    if args.compact:
+        print(f"Compaction removed {compact()} files")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run LLM comparison sweeps from the command line")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run a sweep, or one shard of it")
+    run_parser.add_argument("--prompts", required=True, help="CSV file with a Prompt column")
+    run_parser.add_argument("--models", nargs="+", required=True, choices=list(MODEL_REGISTRY))
+    run_parser.add_argument("--run-count", type=int, default=1, help="Runs per prompt")
+    run_parser.add_argument("--run-id", help="Sweep id shared by all shards (default: derived from the date and arguments)")
+    run_parser.add_argument("--shard", type=parse_shard, help="Run only shard i of N, as i/N")
+    run_parser.add_argument("--out", help="Write results to a Parquet file in this directory instead of the result store")
+    run_parser.add_argument("--max-in-flight", type=int, help="Concurrency ceiling per provider")
+    run_parser.add_argument("--stream", action="store_true", help="Stream responses to record time to first token")
+    run_parser.add_argument("--hedge", action="store_true", help="Hedge requests slower than the recent p95 latency")
+    run_parser.add_argument("--single-sample", action="store_true", help="Send one request per run instead of n completions per call")
+    run_parser.add_argument("--use-cache", action="store_true", help="Reuse cached responses")
+    run_parser.add_argument("--only-missing", action="store_true", help="With --use-cache, skip cached cells entirely")
+    run_parser.add_argument("--no-records", dest='records', action="store_false",
+                            help="Don't write to the record store (otherwise an unavailable store fails the run)")
+    run_parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL_SECONDS,
+                            help="Seconds between progress lines")
+    run_parser.set_defaults(handler=run)
+
+    merge_parser = subparsers.add_parser('merge', help="Merge shard outputs into the result store")
+    merge_parser.add_argument("paths", nargs="+", help="Parquet files written by run --out, or directories of them")
+    merge_parser.add_argument("--compact", action="store_true", help="Compact the result store afterwards")
+    merge_parser.set_defaults(handler=merge)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
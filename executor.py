@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import threading
+from collections import deque
+
+from hedging import model_deadline
+from rate_limit import build_limiters
+from tracing import count
+from response_cache import cache_key, model_params
+from utils import (
+    MODEL_IDS,
+    MODEL_PROVIDERS,
+    MULTI_SAMPLE_PROVIDERS,
+    apply_model_async,
+    apply_model_samples_async,
+    get_current_date
+)
+
+# Model clients are cached process-wide and their async HTTP connections are
+# bound to the loop that first used them, so every sweep runs on one loop
+_sweep_loop = None
+_sweep_loop_lock = threading.Lock()
+
+def provider_for(model_name):
+    return MODEL_PROVIDERS.get(model_name, model_name)
+
+def parse_shard(text):
+    """Parse 'i/N' (1 <= i <= N) into (i, N)"""
+    try:
+        index, count = (int(part) for part in str(text).split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {text!r}") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+def in_shard(prompt, shard):
+    """Whether a prompt belongs to shard (i, N).
+
+    Prompts are assigned by a hash of their text, so every process and
+    machine agrees on the split and identical prompts share a shard.
+    """
+    index, count = shard
+    return int(hashlib.sha1(str(prompt).encode('utf-8')).hexdigest()[:8], 16) % count == index - 1
+
+def build_work_items(df, selected_models, run_count, shard=None):
+    """Expand a prompt dataframe into one work item per (run, model, prompt), optionally only one shard's"""
+    prompts = [
+        (index, user_input) for index, user_input in enumerate(df['Prompt'])
+        if shard is None or in_shard(user_input, shard)
+    ]
+    items = []
+    for i in range(1, run_count + 1):
+        for model_name in selected_models:
+            for index, user_input in prompts:
+                items.append({'run': i, 'model': model_name, 'prompt': user_input, 'prompt_index': index})
+    return items
+
+def cell_id(row):
+    """Identify a (run, model, prompt) cell of a sweep"""
+    return f"{row['run']}:{row['model']}:{row['prompt_index']}"
+
+def _item_cache_key(item, models):
+    model_name = item['model']
+    return cache_key(MODEL_IDS.get(model_name, model_name), item['prompt'], model_params(models[model_name]))
+
+def _uses_cache(item, cache, bypass_cache_for_repeats):
+    return cache is not None and not (bypass_cache_for_repeats and item['run'] > 1)
+
+def skip_cached(work_items, models, cache, bypass_cache_for_repeats=True):
+    """Work items the cache can't answer (what an only_missing sweep runs)"""
+    return [
+        item for item in work_items
+        if not (_uses_cache(item, cache, bypass_cache_for_repeats)
+                and cache.get(_item_cache_key(item, models)) is not None)
+    ]
+
+def result_row(item, outcome, cache_hit=False):
+    return {
+        'model': item['model'],
+        'prompt': item['prompt'],
+        'run': item['run'],
+        'prompt_index': item['prompt_index'],
+        'response': outcome['response'],
+        'time_seconds': outcome['time_seconds'],
+        'current_date': get_current_date(),
+        'error_type': outcome['error_type'],
+        'attempts': outcome['attempts'],
+        'cache_hit': cache_hit,
+        'ttft_seconds': outcome.get('ttft_seconds'),
+        'output_tokens': outcome.get('output_tokens'),
+        'tokens_per_second': outcome.get('tokens_per_second'),
+        'hedged': outcome.get('hedged', False),
+        # Completions returned by the call this row came from; rows of a shared call share its latency
+        'samples': outcome.get('samples', 1)
+    }
+
+def plan_calls(work_items, cache=None, bypass_cache_for_repeats=True, multi_sample=True, stream=False):
+    """Group work items into model calls.
+
+    Items with the same (model, prompt) are deduplicated: all items of one
+    run share a sample, and so do all items answered from the cache. Each
+    call is a list of slots, one per sample, holding the items it answers.
+    Models whose provider returns several completions per request get one
+    call for all of a prompt's samples; others get one call per sample.
+    Streaming sweeps always use one call per sample.
+    """
+    groups = {}
+    for item in work_items:
+        slots = groups.setdefault((item['model'], item['prompt']), {})
+        cached = _uses_cache(item, cache, bypass_cache_for_repeats)
+        slot = slots.setdefault('cached' if cached else item['run'], {'cached': cached, 'items': []})
+        slot['items'].append(item)
+
+    calls = []
+    for (model_name, _), slots in groups.items():
+        if multi_sample and not stream and provider_for(model_name) in MULTI_SAMPLE_PROVIDERS:
+            calls.append(list(slots.values()))
+        else:
+            calls.extend([slot] for slot in slots.values())
+    return calls
+
+async def _run_call(slots, models, limiters, cache=None, stream=False, on_partial=None, hedge=False):
+    """Answer one planned call, returning a result row for every item in its slots"""
+    first = slots[0]['items'][0]
+    model_name = first['model']
+    rows = []
+    key = None
+    if cache is not None and any(slot['cached'] for slot in slots):
+        key = _item_cache_key(first, models)
+        cached = cache.get(key)
+        if cached is not None:
+            outcome = {**cached, 'error_type': None, 'attempts': 0}
+            for slot in slots:
+                if slot['cached']:
+                    rows.extend(result_row(item, outcome, cache_hit=True) for item in slot['items'])
+            count("cache_hits")
+            slots = [slot for slot in slots if not slot['cached']]
+    if not slots:
+        return rows
+
+    limiter = limiters[provider_for(model_name)]
+    deadline = model_deadline(model_name)
+    if len(slots) > 1:
+        outcomes = await apply_model_samples_async(
+            models[model_name], first['prompt'], len(slots), limiter, deadline, hedge
+        )
+    else:
+        item = slots[0]['items'][0]
+        on_chunk = (lambda text: on_partial(item, text)) if on_partial is not None else None
+        outcomes = [await apply_model_async(
+            models[model_name], first['prompt'], limiter, stream, on_chunk, deadline, hedge
+        )]
+
+    for slot, outcome in zip(slots, outcomes):
+        if slot['cached'] and key is not None and outcome['error_type'] is None:
+            cache.put(key, MODEL_IDS.get(model_name, model_name), outcome['response'], outcome['time_seconds'])
+        rows.extend(result_row(item, outcome) for item in slot['items'])
+    return rows
+
+async def run_sweep_async(models, work_items, on_result=None, max_in_flight=None,
+                          cache=None, only_missing=False, bypass_cache_for_repeats=True,
+                          stream=False, on_partial=None, collect=True, multi_sample=True, bus=None,
+                          hedge=False):
+    """Run all work items concurrently under each provider's rate limiter.
+
+    Each provider gets a pool of workers (its concurrency ceiling, which
+    max_in_flight optionally overrides) pulling from its own queue, so
+    providers run in parallel without one task per work item.
+    With a cache, cached responses are returned as cache_hit rows; with
+    only_missing they are skipped entirely. Runs after the first bypass the
+    cache when bypass_cache_for_repeats is set, so run_count still measures variance.
+    With stream=True responses are streamed to record time-to-first-token, and
+    on_partial(item, text_so_far) receives partial responses.
+    Identical (model, prompt) items are deduplicated and, with multi_sample,
+    repeated runs are requested as n completions of one call where the
+    provider supports it (see plan_calls); every item still gets its own row.
+    Every request is bounded by its model's deadline (hedging.MODEL_DEADLINES);
+    with hedge=True requests slower than the model's recent tail latency are
+    duplicated and the first response wins (rows record this as hedged).
+
+    on_result(result, done, total) is called as each call finishes, in completion order.
+    With collect=False results are only passed to on_result, keeping memory flat.
+    With a ProgressBus, results and partial responses are also published to it
+    for display; publishing never waits on the display.
+    """
+    if bus is not None:
+        forward_partial = on_partial
+
+        def on_partial(item, text):
+            if forward_partial is not None:
+                forward_partial(item, text)
+            bus.publish('partial', item=item, text=text)
+
+    if cache is not None and only_missing:
+        work_items = skip_cached(work_items, models, cache, bypass_cache_for_repeats)
+
+    queues = {}
+    for call in plan_calls(work_items, cache, bypass_cache_for_repeats, multi_sample, stream):
+        queues.setdefault(provider_for(call[0]['items'][0]['model']), deque()).append(call)
+    limiters = build_limiters(queues, max_in_flight)
+    finished = asyncio.Queue()
+
+    async def worker(provider):
+        pending = queues[provider]
+        try:
+            while pending:
+                for row in await _run_call(pending.popleft(), models, limiters, cache, stream, on_partial, hedge):
+                    await finished.put(row)
+        except Exception as e:
+            await finished.put(e)
+
+    workers = [
+        asyncio.ensure_future(worker(provider))
+        for provider, limiter in limiters.items()
+        for _ in range(limiter.max_concurrency)
+    ]
+
+    results = []
+    total = len(work_items)
+    try:
+        for done in range(1, total + 1):
+            result = await finished.get()
+            if isinstance(result, Exception):
+                raise result
+            if collect:
+                results.append(result)
+            if on_result is not None:
+                on_result(result, done, total)
+            if bus is not None:
+                bus.publish('result', result=result, done=done, total=total)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    if cache is not None:
+        cache.evict()
+    return results
+
+def _get_sweep_loop():
+    global _sweep_loop
+    with _sweep_loop_lock:
+        if _sweep_loop is None:
+            _sweep_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sweep_loop.run_forever, name="sweep-loop", daemon=True).start()
+    return _sweep_loop
+
+def run_sweep(models, work_items, on_result=None, max_in_flight=None, **options):
+    """Blocking wrapper around run_sweep_async.
+
+    The sweep runs on the process-wide sweep loop thread, so on_result and
+    on_partial are called from that thread.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        run_sweep_async(models, work_items, on_result, max_in_flight, **options),
+        _get_sweep_loop()
+    )
+    return future.result()
@@ -0,0 +1,85 @@
+import hashlib
+import itertools
+import json
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+EXPORT_DIR = 'data/exports'
+
+# Exports kept on disk; the least recently downloaded beyond this are deleted
+MAX_CACHED_EXPORTS = 20
+
+# Format label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'JSONL': ('jsonl', 'application/x-ndjson'),
+}
+
+def export_path(version, filters, extension, root=EXPORT_DIR):
+    """Cache path for one (dataset version, filter, format) export"""
+    key = json.dumps([version, filters, extension], sort_keys=True, default=list)
+    return os.path.join(root, f"{hashlib.sha1(key.encode()).hexdigest()}.{extension}")
+
+def _write_batches(batches, path, extension):
+    """Write record batches to path one at a time; nothing holds the whole export in memory"""
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        first = pa.record_batch([], schema=pa.schema([]))
+    if extension == 'parquet':
+        with pq.ParquetWriter(path, first.schema, compression='zstd') as writer:
+            writer.write_batch(first)
+            for batch in batches:
+                writer.write_batch(batch)
+    elif extension == 'csv.gz':
+        with pa.CompressedOutputStream(path, 'gzip') as stream:
+            with pacsv.CSVWriter(stream, first.schema) as writer:
+                writer.write_batch(first)
+                for batch in batches:
+                    writer.write_batch(batch)
+    elif extension == 'jsonl':
+        with open(path, 'w', encoding='utf-8') as f:
+            for batch in itertools.chain([first], batches) if first.num_rows else batches:
+                f.write(batch.to_pandas().to_json(orient='records', lines=True, force_ascii=False).rstrip('\n'))
+                f.write('\n')
+    else:
+        raise ValueError(f"Unknown export format: {extension}")
+
+def prune_exports(max_files=MAX_CACHED_EXPORTS, root=EXPORT_DIR):
+    """Delete the least recently used exports beyond max_files"""
+    if not os.path.isdir(root):
+        return
+    paths = [os.path.join(root, name) for name in os.listdir(root) if '.tmp-' not in name]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[max_files:]:
+        os.remove(path)
+
+def cached_export(version, filters, extension, batches, root=EXPORT_DIR):
+    """Path of an export file, building it from batches() only on a cache miss.
+
+    batches is a callable returning an iterable of record batches, so a
+    cached export never touches the source. Exports are written to a
+    temporary name and renamed into place. A version of None disables
+    caching, for sources without a cheap fingerprint.
+    """
+    path = export_path(version if version is not None else uuid.uuid4().hex, filters, extension, root)
+    if os.path.exists(path):
+        # Touched so pruning keeps recently downloaded exports
+        os.utime(path)
+        return path
+    os.makedirs(root, exist_ok=True)
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    try:
+        _write_batches(batches(), tmp_path, extension)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    prune_exports(root=root)
+    return path
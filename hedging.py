@@ -0,0 +1,51 @@
+import threading
+from collections import deque
+
+# Seconds a single request may take before it is abandoned as a timeout (and
+# retried like any other timeout). Streamed requests must finish, not just
+# start, within the deadline.
+DEFAULT_DEADLINE_SECONDS = 120.0
+
+# Per-model overrides of DEFAULT_DEADLINE_SECONDS, by display name
+MODEL_DEADLINES = {
+    "claude-sonnet": 180.0,
+    "gemini-1.5-pro": 180.0,
+    "deepseek": 240.0,
+}
+
+# A hedged request is duplicated once it has run longer than this percentile
+# of the model's recent latencies...
+HEDGE_PERCENTILE = 0.95
+
+# ...but never sooner than this, so fast models aren't hedged on jitter
+HEDGE_MIN_DELAY_SECONDS = 1.0
+
+# Latencies kept per model, and how many are needed before hedging starts
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+def model_deadline(model_name):
+    return MODEL_DEADLINES.get(model_name, DEFAULT_DEADLINE_SECONDS)
+
+class LatencyTracker:
+    """Recent successful request latencies per key, for picking hedge delays"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def observe(self, key, seconds):
+        with self.lock:
+            self.samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def hedge_delay(self, key, percentile=HEDGE_PERCENTILE):
+        """Seconds after which a request for key should be hedged, or None until enough latencies are known"""
+        with self.lock:
+            samples = sorted(self.samples.get(key, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY_SECONDS, samples[min(len(samples) - 1, int(percentile * len(samples)))])
+
+# Shared by every sweep in the process, so later sweeps hedge from the first request
+latencies = LatencyTracker()
@@ -0,0 +1,364 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from tracing import set_run, span, traced
+
+JOBS_FILE = 'data/jobs.sqlite'
+
+# Worker processes started by the app; override with LLM_JOB_WORKERS
+DEFAULT_WORKERS = int(os.environ.get("LLM_JOB_WORKERS", 2))
+
+# Seconds an idle worker waits before looking for queued jobs again
+WORKER_POLL_SECONDS = 1.0
+
+# Seconds between progress writes from a running job; events in between are coalesced
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+# 'waiting' jobs sleep between polls of their provider batches
+ACTIVE_STATUSES = ('queued', 'running', 'waiting', 'cancelling')
+
+class JobCancelled(Exception):
+    pass
+
+def _connect(path=JOBS_FILE):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            run_id TEXT,
+            status TEXT,
+            options TEXT,
+            done INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            last_message TEXT,
+            last_partial TEXT,
+            error TEXT,
+            worker_pid INTEGER,
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            not_before TEXT,
+            log TEXT
+        )
+    """)
+    # Job tables created by earlier versions lack the newer columns
+    existing = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column in ('not_before', 'log'):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS batches (
+            batch_id TEXT PRIMARY KEY,
+            job_id TEXT,
+            run_id TEXT,
+            model TEXT,
+            status TEXT,
+            requests INTEGER,
+            message TEXT,
+            submitted_at TEXT,
+            updated_at TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_batches_job ON batches (job_id)")
+    return conn
+
+@traced("job_update")
+def _update_job(job_id, path=JOBS_FILE, **fields):
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with closing(_connect(path)) as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+
+def submit_job(run_id, options=None, path=JOBS_FILE):
+    """Queue a sweep for a journaled run; resubmitting a run resumes it"""
+    job_id = uuid.uuid4().hex[:12]
+    with closing(_connect(path)) as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, run_id, status, options, created_at) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, run_id, json.dumps(options or {}), datetime.now().isoformat())
+        )
+    return job_id
+
+def cancel_job(job_id, path=JOBS_FILE):
+    """Cancel a queued or waiting job immediately, or ask the running worker to stop"""
+    with closing(_connect(path)) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'waiting')",
+            (datetime.now().isoformat(), job_id)
+        )
+        conn.execute("UPDATE jobs SET status = 'cancelling' WHERE id = ? AND status = 'running'", (job_id,))
+
+def get_job(job_id, path=JOBS_FILE):
+    with closing(_connect(path)) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row is not None else None
+
+def list_jobs(limit=20, path=JOBS_FILE):
+    with closing(_connect(path)) as conn:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(row) for row in rows]
+
+def active_run_ids(path=JOBS_FILE):
+    placeholders = ", ".join("?" * len(ACTIVE_STATUSES))
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(f"SELECT run_id FROM jobs WHERE status IN ({placeholders})", ACTIVE_STATUSES)
+        return {row['run_id'] for row in rows}
+
+def _claim_next_job(path=JOBS_FILE):
+    with closing(_connect(path)) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' OR (status = 'waiting' AND not_before <= ?) "
+            "ORDER BY created_at LIMIT 1",
+            (datetime.now().isoformat(),)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ? WHERE id = ?",
+                (os.getpid(), datetime.now().isoformat(), row['id'])
+            )
+        conn.execute("COMMIT")
+    return dict(row) if row is not None else None
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+def requeue_orphaned_jobs(path=JOBS_FILE):
+    """Put running jobs whose worker died back in the queue; their journal resumes them"""
+    with closing(_connect(path)) as conn:
+        rows = conn.execute("SELECT id, status, worker_pid FROM jobs WHERE status IN ('running', 'cancelling')").fetchall()
+        for row in rows:
+            if _pid_alive(row['worker_pid']):
+                continue
+            if row['status'] == 'cancelling':
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?",
+                    (datetime.now().isoformat(), row['id'])
+                )
+            else:
+                conn.execute("UPDATE jobs SET status = 'queued', worker_pid = NULL WHERE id = ?", (row['id'],))
+
+def record_batch(batch_id, job_id, run_id, model, requests, path=JOBS_FILE):
+    """Remember a provider batch submitted for a job, so later polls find it"""
+    now = datetime.now().isoformat()
+    with closing(_connect(path)) as conn:
+        conn.execute(
+            "INSERT INTO batches (batch_id, job_id, run_id, model, status, requests, submitted_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'submitted', ?, ?, ?)",
+            (batch_id, job_id, run_id, model, requests, now, now)
+        )
+
+def update_batch(batch_id, path=JOBS_FILE, **fields):
+    fields['updated_at'] = datetime.now().isoformat()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with closing(_connect(path)) as conn:
+        conn.execute(f"UPDATE batches SET {assignments} WHERE batch_id = ?", [*fields.values(), batch_id])
+
+def list_batches(job_id, path=JOBS_FILE):
+    with closing(_connect(path)) as conn:
+        rows = conn.execute("SELECT * FROM batches WHERE job_id = ? ORDER BY submitted_at", (job_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+def build_firestore_document(result, run_id=None):
+    from utils import get_current_date
+    return {
+        'id': str(uuid.uuid4()),
+        'model': result['model'],
+        'prompt': result['prompt'],
+        'response': result['response'],
+        'time_seconds': result['time_seconds'],
+        'timestamp': datetime.now().isoformat(),
+        'date': get_current_date(),
+        'run_id': run_id
+    }
+
+def build_sweep_options(options):
+    """run_sweep keyword arguments for a job's options"""
+    from response_cache import ResponseCache
+    sweep_options = {
+        'stream': options.get('stream', False),
+        'multi_sample': options.get('multi_sample', True),
+        'hedge': options.get('hedge', False)
+    }
+    if options.get('use_cache'):
+        sweep_options.update({
+            'cache': ResponseCache(),
+            'only_missing': options.get('only_missing', False),
+            'bypass_cache_for_repeats': options.get('bypass_cache_for_repeats', True)
+        })
+    return sweep_options
+
+def run_job(job, path=JOBS_FILE):
+    """Run one claimed job in this process, skipping cells its journal already completed.
+
+    A deferred job sends the prompts of batch-capable models to their
+    provider's batch API and runs everything else live. While batches are
+    still running the job is parked as 'waiting' and claimed again after
+    BATCH_POLL_SECONDS; it completes once every batch has been imported.
+    """
+    # Imported here so the job table can be used without loading model SDKs
+    from executor import build_work_items, cell_id, run_sweep, skip_cached
+    from journal import RunJournal
+    from progress_bus import ProgressBus
+    from storage import get_storage
+    from utils import MODEL_PROVIDERS, initialize_models
+
+    options = json.loads(job['options'] or '{}')
+    journal = RunJournal(job['run_id'])
+    manifest = journal.manifest()
+    completed = journal.completed_cells()
+    work_items = [
+        item for item in build_work_items(
+            journal.load_prompts(), manifest['models'], manifest['run_count'], journal.shard()
+        )
+        if cell_id(item) not in completed
+    ]
+    models = initialize_models(manifest['models'])
+
+    deferred = {}
+    if options.get('deferred'):
+        from provider_batches import supports_batches
+        for item in work_items:
+            if supports_batches(item['model']):
+                deferred.setdefault(item['model'], []).append(item)
+        work_items = [item for item in work_items if item['model'] not in deferred]
+
+    sweep_options = build_sweep_options(options)
+
+    # Results always reach the journal; the record store is skipped while its health check fails.
+    # A cached failure is rechecked, so one bad check doesn't skip every job for the cache's lifetime.
+    store = get_storage()
+    healthy, health_message = store.health()
+    if not healthy:
+        healthy, health_message = store.health(ttl=0)
+    writer = store.writer() if healthy else None
+    if not healthy:
+        _update_job(job['id'], path, last_message=f"Record store '{store.name}' unavailable: {health_message}")
+
+    def record(result):
+        journal.append(result)
+        if writer is not None:
+            writer.add(build_firestore_document(result, job['run_id']))
+
+    # Progress reaches the job table through the bus, so the sweep never waits on it
+    bus = ProgressBus(PROGRESS_INTERVAL_SECONDS)
+    cancel_requested = threading.Event()
+
+    def show_progress(update):
+        fields = {'done': update['done'], 'last_partial': update['partial'], 'log': json.dumps(update['log'])}
+        if update['lines']:
+            fields['last_message'] = update['lines'][-1]
+        _update_job(job['id'], path, **fields)
+        if get_job(job['id'], path)['status'] == 'cancelling':
+            cancel_requested.set()
+
+    bus.subscribe(show_progress)
+
+    def on_result(result, done, total):
+        record(result)
+        if cancel_requested.is_set():
+            raise JobCancelled()
+
+    max_in_flight = options.get('max_in_flight')
+    limits = {provider: max_in_flight for provider in MODEL_PROVIDERS.values()} if max_in_flight else None
+    pending_batches = 0
+    try:
+        if deferred:
+            from provider_batches import advance_batches
+            pending_batches, fallback = advance_batches(job['id'], job['run_id'], models, deferred, record, path)
+            work_items += fallback
+        if sweep_options.get('only_missing'):
+            # Filtered here rather than in the sweep, so the job's total counts only the calls it makes
+            work_items = skip_cached(work_items, models, sweep_options['cache'], sweep_options['bypass_cache_for_repeats'])
+            sweep_options['only_missing'] = False
+        _update_job(job['id'], path, total=len(work_items), done=0)
+        if work_items:
+            run_sweep(models, work_items, on_result, limits, collect=False, bus=bus, **sweep_options)
+    except JobCancelled:
+        _update_job(job['id'], path, status='cancelled', finished_at=datetime.now().isoformat())
+        return
+    finally:
+        bus.close()
+        journal.close()
+        if writer is not None:
+            writer.close()
+
+    if get_job(job['id'], path)['status'] == 'cancelling':
+        _update_job(job['id'], path, status='cancelled', finished_at=datetime.now().isoformat())
+        return
+
+    if pending_batches:
+        from provider_batches import BATCH_POLL_SECONDS
+        _update_job(
+            job['id'], path, status='waiting', worker_pid=None,
+            not_before=(datetime.now() + timedelta(seconds=BATCH_POLL_SECONDS)).isoformat(),
+            last_message=f"Waiting for {pending_batches} provider batch(es)"
+        )
+        return
+
+    journal.finalize()
+    if writer is None:
+        errors = f"Results were not written to record store '{store.name}': {health_message}"
+    else:
+        errors = "; ".join(writer.errors) if writer.errors else None
+    _update_job(job['id'], path, status='complete', error=errors, finished_at=datetime.now().isoformat())
+
+def worker_loop(path=JOBS_FILE):
+    """Claim and run queued jobs forever"""
+    while True:
+        job = _claim_next_job(path)
+        if job is None:
+            time.sleep(WORKER_POLL_SECONDS)
+            continue
+        set_run(job['run_id'])
+        try:
+            with span("job", job_id=job['id']):
+                run_job(job, path)
+        except Exception as e:
+            _update_job(job['id'], path, status='failed', error=str(e), finished_at=datetime.now().isoformat())
+        finally:
+            set_run(None)
+
+_workers = []
+_workers_lock = threading.Lock()
+
+def ensure_workers(count=DEFAULT_WORKERS, path=JOBS_FILE):
+    """Start worker processes for this server if they aren't already running"""
+    with _workers_lock:
+        _workers[:] = [process for process in _workers if process.is_alive()]
+        if not _workers:
+            requeue_orphaned_jobs(path)
+        context = multiprocessing.get_context('spawn')
+        while len(_workers) < count:
+            process = context.Process(target=worker_loop, args=(path,), name="llm-job-worker", daemon=True)
+            process.start()
+            _workers.append(process)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run LLM comparison job workers")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of worker processes")
+    args = parser.parse_args()
+    requeue_orphaned_jobs()
+    processes = [
+        multiprocessing.Process(target=worker_loop, name="llm-job-worker")
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
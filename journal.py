@@ -0,0 +1,214 @@
+import json
+import os
+import uuid
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+from executor import cell_id, in_shard
+from prompt_store import iter_prompts, load_prompt_set_metadata
+from result_store import merge_result_files, write_result_file, write_results
+from tracing import traced
+
+JOURNAL_DIR = 'data/journal'
+
+# Rows per result_store write when a finished run is moved out of the journal
+FINALIZE_CHUNK_ROWS = 10000
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class RunJournal:
+    """Append-only record of the completed cells of one sweep.
+
+    Each finished (run, model, prompt) cell is appended as a JSON line and
+    flushed immediately, so a crash or script rerun loses at most the calls
+    in flight. The run configuration, including the (immutable) prompt set,
+    is kept alongside so the sweep can be resumed later under the same run id.
+    """
+
+    def __init__(self, run_id, root=JOURNAL_DIR):
+        self.run_id = run_id
+        self.directory = os.path.join(root, run_id)
+        self.manifest_path = os.path.join(self.directory, 'manifest.json')
+        self.prompts_path = os.path.join(self.directory, 'prompts.csv')
+        self.results_path = os.path.join(self.directory, 'results.jsonl')
+        self._file = None
+
+    @classmethod
+    def create(cls, prompt_set_id, selected_models, run_count, root=JOURNAL_DIR, run_id=None,
+               shard=None, sweep_id=None):
+        """Start a journal.
+
+        A sharded run (shard=(i, N)) covers only that shard's prompts; its
+        results belong to the sweep sweep_id, which every shard shares.
+        """
+        run_id = run_id or f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        journal = cls(run_id, root)
+        os.makedirs(journal.directory, exist_ok=True)
+        prompt_count = load_prompt_set_metadata(prompt_set_id)['rows']
+        manifest = {
+            'run_id': run_id,
+            'prompt_set': prompt_set_id,
+            'models': list(selected_models),
+            'run_count': int(run_count),
+            'total_cells': int(run_count) * len(selected_models) * prompt_count,
+            'created_at': datetime.now().isoformat(),
+            'status': 'running'
+        }
+        if shard is not None:
+            manifest['shard'] = list(shard)
+            manifest['sweep_id'] = sweep_id or run_id
+            manifest['total_cells'] = int(run_count) * len(selected_models) * sum(
+                in_shard(prompt, shard) for prompt in iter_prompts(prompt_set_id)
+            )
+        _write_json_atomic(journal.manifest_path, manifest)
+        return journal
+
+    def shard(self):
+        """(i, N) for a sharded run, otherwise None"""
+        shard = self.manifest().get('shard')
+        return tuple(shard) if shard else None
+
+    def manifest(self):
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def update_manifest(self, **changes):
+        manifest = self.manifest()
+        manifest.update(changes)
+        _write_json_atomic(self.manifest_path, manifest)
+
+    def load_prompts(self):
+        manifest = self.manifest()
+        if 'prompt_set' in manifest:
+            return pd.DataFrame({'Prompt': list(iter_prompts(manifest['prompt_set']))})
+        # Journals from before prompt sets kept a copy of the prompts
+        return pd.read_csv(self.prompts_path)
+
+    @traced("journal_append")
+    def append(self, result):
+        if self._file is None:
+            self._file = open(self.results_path, 'a+b')
+            # Finish a line a crash cut short, so the next result starts on a line of its own
+            if self._file.tell() > 0:
+                self._file.seek(-1, os.SEEK_END)
+                if self._file.read(1) != b'\n':
+                    self._file.write(b'\n')
+        self._file.write((json.dumps({**result, 'run_id': self.run_id}, default=str) + '\n').encode('utf-8'))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _iter_rows(self):
+        if not os.path.exists(self.results_path):
+            return
+        with open(self.results_path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash; that cell is simply re-run
+                    continue
+
+    def completed_cells(self):
+        """Cells with a successful result; failed cells are retried on resume"""
+        completed = set()
+        for row in self._iter_rows():
+            if row.get('error_type') is None:
+                completed.add(cell_id(row))
+            else:
+                completed.discard(cell_id(row))
+        return completed
+
+    def _latest_chunks(self, chunk_rows=FINALIZE_CHUNK_ROWS):
+        """The last result of every cell, as DataFrames of up to chunk_rows rows"""
+        self.close()
+        last_line = {}
+        for line_number, row in enumerate(self._iter_rows()):
+            last_line[cell_id(row)] = line_number
+
+        chunk = []
+        for line_number, row in enumerate(self._iter_rows()):
+            if last_line[cell_id(row)] != line_number:
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk)
+
+    @traced("journal_finalize")
+    def finalize(self, chunk_rows=FINALIZE_CHUNK_ROWS):
+        """Move the journal into the result store, keeping the last result per cell.
+
+        A shard is merged under its sweep's run id instead, deduplicated
+        against whatever other shards already stored.
+        """
+        sweep_id = self.manifest().get('sweep_id')
+        if sweep_id:
+            path = os.path.join(self.directory, 'results.parquet')
+            cells = self.export(path, sweep_id, chunk_rows)
+            merge_result_files([path])
+            return cells
+        cells = 0
+        for part, chunk in enumerate(self._latest_chunks(chunk_rows)):
+            write_results(chunk, self.run_id, part=part)
+            cells += len(chunk)
+        self.update_manifest(status='complete', completed_at=datetime.now().isoformat())
+        return cells
+
+    def export(self, path, run_id=None, chunk_rows=FINALIZE_CHUNK_ROWS):
+        """Write the last result per cell to a standalone result file (see result_store.merge_result_files).
+
+        Rows are labelled with run_id (the journal's own by default), so the
+        shards of one sweep merge under a single run id. Marks the run complete.
+        """
+        run_id = run_id or self.run_id
+        chunks = (chunk.assign(run_id=run_id) for chunk in self._latest_chunks(chunk_rows))
+        cells = write_result_file(chunks, path, run_id)
+        self.update_manifest(status='complete', completed_at=datetime.now().isoformat(), exported_to=path)
+        return cells
+
+    def read_since(self, offset=0):
+        """Results appended after byte offset, and the offset to continue from next time"""
+        if not os.path.exists(self.results_path):
+            return [], offset
+        rows = []
+        with open(self.results_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Still being written; picked up on the next read
+                    break
+                offset += len(line)
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return rows, offset
+
+    def tail(self, rows=100):
+        """The most recently journaled results, for display"""
+        return pd.DataFrame(list(deque(self._iter_rows(), maxlen=rows)))
+
+def list_runs(status=None, root=JOURNAL_DIR):
+    """Manifests of journaled runs, newest first, optionally filtered by status"""
+    runs = []
+    if os.path.isdir(root):
+        for run_id in os.listdir(root):
+            journal = RunJournal(run_id, root)
+            if not os.path.exists(journal.manifest_path):
+                continue
+            manifest = journal.manifest()
+            if status is None or manifest.get('status') == status:
+                runs.append(manifest)
+    return sorted(runs, key=lambda manifest: manifest['created_at'], reverse=True)
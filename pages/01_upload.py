@@ -1,47 +1,68 @@
 import streamlit as st
-import pandas as pd
-import os
 from utils import PROMPT_FILE, ensure_data_directory
+from prompt_store import (
+    PromptFileError,
+    clear_current_prompt_set,
+    current_prompt_set,
+    ingest_prompt_file,
+    read_prompt_page,
+    set_current_prompt_set
+)
 
 st.set_page_config(page_title="Upload Prompts", page_icon="📤")
 st.title("Upload Prompts")
 
 ensure_data_directory()
 
-def validate_csv(df):
-    if 'Prompt' not in df.columns:
-        st.error("CSV file must contain a 'Prompt' column")
-        return False
-    return True
+# Prompts shown per preview page
+PREVIEW_PAGE_SIZE = 100
+
+def show_preview(metadata, title):
+    st.subheader(title)
+
+    page_count = max(1, -(-metadata['rows'] // PREVIEW_PAGE_SIZE))
+    page = st.number_input(
+        f"Page (of {page_count})",
+        min_value=1,
+        max_value=page_count,
+        value=1,
+        key=f"preview_page_{metadata['set_id']}"
+    )
+    st.dataframe(read_prompt_page(metadata['set_id'], page - 1, PREVIEW_PAGE_SIZE), hide_index=True)
+
+    # Display stats
+    st.info(f"Total prompts: {metadata['rows']}")
+    if metadata['duplicates']:
+        action = "dropped" if metadata['duplicates_dropped'] else "kept"
+        st.warning(f"{metadata['duplicates']} duplicate prompts detected ({action})")
 
 with st.container():
     uploaded_file = st.file_uploader("Upload a prompt file", type=["csv"])
+    drop_duplicates = st.checkbox(
+        "Drop duplicate prompts",
+        value=False,
+        help="Keep only the first occurrence of prompts that are identical up to whitespace"
+    )
 
     if uploaded_file is not None:
-        df = pd.read_csv(uploaded_file)
-        
-        if validate_csv(df):
+        try:
+            # Content-addressed: re-running the script with the same upload does no work
+            with st.spinner("Ingesting prompts..."):
+                metadata = ingest_prompt_file(uploaded_file, uploaded_file.name, drop_duplicates)
+        except PromptFileError as e:
+            st.error(str(e))
+        else:
+            set_current_prompt_set(metadata['set_id'])
             st.success("File uploaded successfully!")
-            
-            # Save the file
-            df.to_csv(PROMPT_FILE, index=False)
-            
-            # Show preview
-            st.subheader("Preview of Uploaded Prompts")
-            st.dataframe(df, hide_index=True)
-            
-            # Display stats
-            st.info(f"Total prompts: {len(df)}")
+            show_preview(metadata, "Preview of Uploaded Prompts")
     else:
-        if os.path.exists(PROMPT_FILE):
+        metadata = current_prompt_set(legacy_csv=PROMPT_FILE)
+        if metadata is not None:
             st.info("Using existing prompts file")
-            df = pd.read_csv(PROMPT_FILE)
-            
-            st.subheader("Current Prompts")
-            st.dataframe(df, hide_index=True)
-            
+            show_preview(metadata, "Current Prompts")
+
             if st.button("Clear Existing Prompts"):
-                os.remove(PROMPT_FILE)
-                st.experimental_rerun()
+                clear_current_prompt_set()
+                st.rerun()
         else:
             st.warning("Please upload a CSV file containing prompts")
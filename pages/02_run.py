@@ -1,105 +1,195 @@
+import json
 import os
-import uuid
-from datetime import datetime
 
-import streamlit as st
 import pandas as pd
+import streamlit as st
 
-from utils import (
-    PROMPT_FILE,
-    initialize_models,
-    apply_model,
-    save_results,
-    get_current_date
-)
-from firebase_config import initialize_firebase, upload_to_firestore
+from utils import PROMPT_FILE, MODEL_IDS
+from prompt_store import current_prompt_set
+from journal import RunJournal, list_runs
+from jobs import active_run_ids, cancel_job, ensure_workers, list_batches, list_jobs, submit_job
 
 st.set_page_config(page_title="Run Models", page_icon="🚀")
 st.title("Run Models")
 
-# Initialize models
-if 'models' not in st.session_state:
-    st.session_state.models = initialize_models()
-
-def upload_result_to_firestore(model_name, prompt, response, elapsed_time):
-    data = {
-        'id': str(uuid.uuid4()),
-        'model': model_name,
-        'prompt': prompt,
-        'response': response,
-        'time_seconds': elapsed_time,
-        'timestamp': datetime.now().isoformat(),
-        'date': get_current_date()
-    }
-    return upload_to_firestore(data)
-
-def run_models(df, selected_models, run_count):
-    current_count = 0
-    total_count = run_count * len(selected_models) * df.shape[0]
-    progress_bar = st.progress(0)
-    results = []
-    
-    # Initialize Firebase
-    firebase_enabled = initialize_firebase()
-    if firebase_enabled:
-        st.sidebar.success("Firebase connection established")
-    else:
-        st.sidebar.warning("Firebase connection not available")
-    
-    with st.status("Running models...", expanded=True) as status:
-        for i in range(1, run_count + 1):
-            for model_name in selected_models:
-                for _, row in df.iterrows():
-                    user_input = row['Prompt']
-                    status.write(f"Run {i}: Processing {model_name} - {user_input[:50]}...")
-                    
-                    rsp, elapsed_time = apply_model(st.session_state.models[model_name], user_input)
-                    results.append({
-                        'model': model_name,
-                        'prompt': user_input,
-                        'response': rsp,
-                        'time_seconds': elapsed_time,
-                        'current_date': get_current_date()
-                    })
-                    
-                    if firebase_enabled:
-                        upload_result_to_firestore(model_name, user_input, rsp, elapsed_time)
-                    
-                    current_count += 1
-                    progress_bar.progress(current_count / total_count)
-        
-        status.update(label="Complete!", state="complete")
-    
-    return pd.DataFrame(results)
+# Seconds between refreshes of the job status view; the UI never renders faster than this,
+# however quickly calls finish
+JOB_POLL_SECONDS = 2
+
+# Newest results kept in a running job's live table
+LIVE_RESULT_ROWS = 200
+
+LIVE_RESULT_COLUMNS = ['model', 'run', 'prompt_index', 'response', 'time_seconds', 'error_type']
+
+# How far from the end of a journal the live table starts reading when first shown
+LIVE_START_BYTES = 1 << 20
+
+# Sweeps run in background worker processes, so they survive reruns and don't block the UI
+ensure_workers()
+
+def live_results(job):
+    """The job's newest results, reading only what its journal gained since the last refresh"""
+    journal = RunJournal(job['run_id'])
+    key = f"live_results_{job['id']}"
+    if key not in st.session_state:
+        size = os.path.getsize(journal.results_path) if os.path.exists(journal.results_path) else 0
+        # A line cut by starting mid-file fails to parse and is skipped
+        st.session_state[key] = {'offset': max(0, size - LIVE_START_BYTES), 'rows': []}
+    state = st.session_state[key]
+    rows, state['offset'] = journal.read_since(state['offset'])
+    state['rows'] = (state['rows'] + [{column: row.get(column) for column in LIVE_RESULT_COLUMNS} for row in rows])[-LIVE_RESULT_ROWS:]
+    return pd.DataFrame(state['rows'], columns=LIVE_RESULT_COLUMNS)
+
+def show_live_progress(job):
+    log = json.loads(job['log'] or '[]')
+    with st.expander("Live log and results"):
+        if log:
+            st.code("\n".join(log[-20:]), language=None)
+        results = live_results(job)
+        if results.empty:
+            st.caption("No results yet")
+        else:
+            st.dataframe(results.iloc[::-1], hide_index=True)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_jobs():
+    jobs = list_jobs()
+    if not jobs:
+        st.info("No jobs submitted yet")
+        return
+
+    for job in jobs:
+        with st.container(border=True):
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.markdown(f"**Job {job['id']}** · run `{job['run_id']}` · {job['status']}")
+                if job['total']:
+                    st.progress(job['done'] / job['total'], text=f"{job['done']}/{job['total']} calls")
+                if job['last_message'] and job['status'] in ('running', 'cancelling'):
+                    st.caption(job['last_message'])
+                if job['last_partial'] and job['status'] == 'running':
+                    st.caption(f"Streaming: {job['last_partial']}")
+                if job['status'] in ('running', 'cancelling'):
+                    show_live_progress(job)
+                if job['status'] == 'waiting':
+                    st.caption(job['last_message'])
+                    for batch in list_batches(job['id']):
+                        st.caption(f"{batch['model']} batch ({batch['requests']} requests): {batch['message'] or batch['status']}")
+                if job['error']:
+                    st.error(job['error'])
+            with col2:
+                if job['status'] in ('queued', 'running', 'waiting'):
+                    st.button("Cancel", key=f"cancel_{job['id']}", on_click=cancel_job, args=(job['id'],))
 
 # Main interface
-if os.path.exists(PROMPT_FILE):
-    df = pd.read_csv(PROMPT_FILE)
-    st.info(f"Found {len(df)} prompts ready to process")
-    
+prompt_set = current_prompt_set(legacy_csv=PROMPT_FILE)
+if prompt_set is not None:
+    st.info(f"Found {prompt_set['rows']} prompts ready to process")
+
     with st.form("run_config"):
         st.subheader("Configure Run")
-        
+
         # Model selection
-        available_models = list(st.session_state.models.keys())
+        available_models = list(MODEL_IDS.keys())
         selected_models = st.multiselect(
             "Select models to run",
             available_models,
             default=available_models
         )
-        
+
         # Run count
         run_count = st.number_input("Number of runs per prompt", min_value=1, value=1)
-        
-        submitted = st.form_submit_button("Start Run")
-        
+
+        # Concurrency
+        max_in_flight = st.number_input(
+            "Max concurrent requests per provider",
+            min_value=1,
+            value=None,
+            placeholder="Provider default",
+            help="Leave blank to use each provider's own ceiling (rate_limit.PROVIDER_LIMITS)"
+        )
+
+        # Response cache
+        use_cache = st.checkbox(
+            "Use response cache",
+            value=False,
+            help="Reuse stored responses for (model, prompt, parameters) already answered"
+        )
+        only_missing = st.checkbox(
+            "Only fill missing cells",
+            value=False,
+            help="Skip cached cells entirely instead of returning them as cache hits"
+        )
+        bypass_cache_for_repeats = st.checkbox(
+            "Bypass cache for repeated runs",
+            value=True,
+            help="Always call the model live for runs after the first, to measure variance"
+        )
+
+        # Streaming
+        stream = st.checkbox(
+            "Stream responses",
+            value=False,
+            help="Record time-to-first-token and generation throughput; the job view shows partial responses"
+        )
+
+        # Deferred mode
+        deferred = st.checkbox(
+            "Deferred (provider batch API)",
+            value=False,
+            help="Submit OpenAI and Anthropic models' prompts as provider batch jobs, which are cheaper but "
+                 "can take up to 24 hours; other models run live"
+        )
+
+        # Repeated runs
+        multi_sample = st.checkbox(
+            "Request repeated runs in one call",
+            value=True,
+            help="Ask providers that support it for all runs of a prompt as several completions of a single request. "
+                 "The runs then share one latency, so run-to-run latency variance isn't measured for those models"
+        )
+
+        # Tail latency
+        hedge = st.checkbox(
+            "Hedge slow requests",
+            value=False,
+            help="Send a duplicate request when a call runs longer than the model's recent 95th percentile "
+                 "latency, keeping whichever answers first; costs a few extra requests"
+        )
+
+        submitted = st.form_submit_button("Submit Run")
+
+        job_options = {
+            'max_in_flight': int(max_in_flight) if max_in_flight else None,
+            'use_cache': use_cache,
+            'only_missing': only_missing,
+            'bypass_cache_for_repeats': bypass_cache_for_repeats,
+            'stream': stream,
+            'multi_sample': multi_sample,
+            'deferred': deferred,
+            'hedge': hedge
+        }
+
         if submitted and selected_models:
-            result_df = run_models(df, selected_models, run_count)
-            
-            if not result_df.empty:
-                st.subheader("Results")
-                st.dataframe(result_df, hide_index=True)
-                save_results(result_df)
-                st.success("Results saved successfully!")
+            journal = RunJournal.create(prompt_set['set_id'], selected_models, run_count)
+            job_id = submit_job(journal.run_id, job_options)
+            st.success(f"Submitted job {job_id} for run {journal.run_id}")
+
+    # Runs interrupted by a crash, cancel or restart can pick up where they stopped
+    busy_runs = active_run_ids()
+    unfinished_runs = [manifest for manifest in list_runs(status='running') if manifest['run_id'] not in busy_runs]
+    if unfinished_runs:
+        st.subheader("Resume Interrupted Run")
+        run_labels = {
+            manifest['run_id']: f"{manifest['run_id']} ({', '.join(manifest['models'])}; {manifest['total_cells']} cells)"
+            for manifest in unfinished_runs
+        }
+        resume_run_id = st.selectbox("Interrupted runs", list(run_labels), format_func=run_labels.get)
+        if st.button("Resume run"):
+            job_id = submit_job(resume_run_id, job_options)
+            st.success(f"Submitted job {job_id} to resume run {resume_run_id}")
 else:
     st.error("No prompts file found. Please upload prompts in the Upload page first.")
+
+st.subheader("Jobs")
+show_jobs()
@@ -1,54 +1,111 @@
+import altair as alt
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 from pathlib import Path
-from utils import RESULT_FILE, load_results, clear_results
-from firebase_config import initialize_firebase, get_all_firestore_records
+from utils import load_results, clear_results
+from result_store import compact, count_results, dataset_version, iter_result_batches, list_partitions
+from analytics import ANALYTICS_COLUMNS, compute_analytics
+from similarity import compare_results, load_comparable_results
+from exports import EXPORT_FORMATS, cached_export
+from storage import get_storage
 
 st.set_page_config(page_title="Download Results", page_icon="📥")
 st.title("Download Results")
 
-def display_stats(df, source="Local"):
-    """Display statistics about the results"""
-    if df is not None and not df.empty:
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Results", len(df))
-        with col2:
-            if 'model' in df.columns:
-                st.metric("Unique Models", df['model'].nunique())
-        with col3:
-            if 'date' in df.columns:
-                st.metric("Unique Dates", df['date'].nunique())
+# Rows rendered in result previews; downloads always include every row
+PREVIEW_ROWS = 1000
+
+def export_controls(key, version, filters, batches, default_name, label, help):
+    """Format and filename inputs plus a download button that builds the export only when clicked"""
+    format_label = st.selectbox("Export format", list(EXPORT_FORMATS), key=f"{key}_format")
+    extension, mime = EXPORT_FORMATS[format_label]
+    filename = st.text_input(
+        "Filename for download",
+        value=f"{default_name}.{extension}",
+        key=f"{key}_filename_{extension}",
+        help="Name of the file to save the results to"
+    )
+    st.download_button(
+        label=label,
+        # Runs on click, off the script thread; repeat downloads of a slice reuse the cached file
+        data=lambda: Path(cached_export(version, filters, extension, batches)).read_bytes(),
+        file_name=filename,
+        mime=mime,
+        on_click="ignore",
+        help=help
+    )
 
-# Create tabs for Local and Firestore downloads
-local_tab, firestore_tab = st.tabs(["📂 Local Results", "☁️ Firestore Results"])
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_analytics(version, dates, models):
+    """Analytics for one dataset version and filter; recomputed only when results change"""
+    return compute_analytics(load_results(list(dates), list(models), ANALYTICS_COLUMNS))
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cached_comparison(version, dates, models):
+    """Response similarity for one dataset version and filter; only unseen responses are signed"""
+    return compare_results(*load_comparable_results(list(dates), list(models)))
+
+# Create tabs for Local and Firestore downloads and analytics
+local_tab, records_tab, analytics_tab, compare_tab = st.tabs(
+    ["📂 Local Results", "☁️ Stored Records", "📈 Analytics", "🔀 Compare"]
+)
 
 # Local Results Tab
 with local_tab:
-    results_df = load_results()
+    local_dates, local_models = list_partitions()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        local_selected_dates = st.multiselect(
+            "📅 Filter by date",
+            options=local_dates,
+            key="local_dates",
+            help="Only the matching date partitions are read"
+        )
+    with col2:
+        local_selected_models = st.multiselect(
+            "🤖 Filter by model",
+            options=local_models,
+            key="local_models",
+            help="Only the matching model partitions are read"
+        )
+    
+    results_df = load_results(local_selected_dates, local_selected_models, limit=PREVIEW_ROWS)
     
     if results_df is not None:
-        display_stats(results_df)
+        local_total = count_results(local_selected_dates, local_selected_models)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Results", local_total)
+        with col2:
+            st.metric("Unique Models", len(local_selected_models or local_models))
+        with col3:
+            st.metric("Unique Dates", len(local_selected_dates or local_dates))
         
         st.subheader("Preview")
+        if local_total > PREVIEW_ROWS:
+            st.caption(f"Previewing the first {PREVIEW_ROWS} of {local_total} rows")
         st.dataframe(results_df, hide_index=True)
         
         col1, col2 = st.columns(2)
         with col1:
-            custom_filename = st.text_input(
-                "Local results filename", 
-                value="complete_set.csv",
-                help="Name of the file to save the results to"
-            )
-            st.download_button(
-                label="📥 Download Local Results",
-                data=results_df.to_csv(index=False),
-                file_name=custom_filename,
-                mime="text/csv",
-                help="Download all local results as a CSV file"
+            export_controls(
+                "local_export",
+                dataset_version(),
+                [sorted(local_selected_dates), sorted(local_selected_models)],
+                lambda: iter_result_batches(local_selected_dates, local_selected_models),
+                "complete_set",
+                "📥 Download Local Results",
+                "Download the filtered local results"
             )
         
         with col2:
+            st.button(
+                "🗜️ Compact Local Store",
+                help="Merge each partition's per-run files into one file for faster reads",
+                on_click=compact
+            )
             st.button(
                 "🗑️ Clear Local Results",
                 help="Delete all local results. This action cannot be undone.",
@@ -58,88 +115,230 @@ with local_tab:
     else:
         st.info("💡 No local results available. Run some models first!")
 
-# Firestore Results Tab
-with firestore_tab:
-    load_button = st.button(
-        "🔄 Load Firestore Records",
-        help="Fetch the latest results from Firestore database"
-    )
+# Stored Records Tab
+with records_tab:
+    store = get_storage()
+    healthy, health_message = store.health()
+    if healthy:
+        st.caption(f"Storage backend: {store.name} ({health_message})")
+    else:
+        st.warning(f"⚠️ Storage backend '{store.name}' is unavailable: {health_message}")
+
+    if store.name == 'firestore':
+        sync_button = st.button(
+            "🔄 Sync Firestore Records",
+            help="Fetch records added to Firestore since the last sync into the local mirror",
+            disabled=not healthy
+        )
+        if sync_button:
+            with st.spinner("📡 Fetching new records from Firestore..."):
+                fetched = store.sync()
+            st.success(f"Fetched {fetched} new records")
+
+    store_dates, store_models = store.filter_options()
+
+    if store_dates or store_models:
+        # Create filter container
+        filter_container = st.container()
+        with filter_container:
+            st.markdown("### 🔍 Filter Options")
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                selected_dates = st.multiselect(
+                    "📅 Filter by date",
+                    options=store_dates,
+                    help="Select one or more dates to filter results"
+                )
+            
+            with col2:
+                selected_models = st.multiselect(
+                    "🤖 Filter by model",
+                    options=store_models,
+                    help="Select one or more models to filter results"
+                )
+            
+            search = st.text_input(
+                "🔎 Search responses",
+                help="Only show records whose response contains all of these words"
+            ).strip()
+            
+            query_live = False
+            if store.name == 'firestore':
+                query_live = st.checkbox(
+                    "Query Firestore directly",
+                    help="Run the filtered query against Firestore instead of the local mirror (no response search)",
+                    disabled=not healthy
+                )
+        
+        if query_live:
+            with st.spinner("📡 Querying Firestore..."):
+                display_df = store.query_live(selected_dates, selected_models)
+            matching = len(display_df) if display_df is not None else 0
+        else:
+            # Counting and the preview's LIMIT run in the store; only previewed rows are loaded
+            matching = store.count(selected_dates, selected_models, search)
+            display_df = store.query(selected_dates, selected_models, search, limit=PREVIEW_ROWS)
+        
+        if display_df is not None and not display_df.empty:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Matching Results", matching)
+            with col2:
+                st.metric("Stored Models", len(store_models))
+            with col3:
+                st.metric("Stored Dates", len(store_dates))
+            
+            st.markdown("### 📊 Results Preview")
+            if matching > PREVIEW_ROWS:
+                st.caption(f"Previewing the first {PREVIEW_ROWS} rows")
+            st.dataframe(display_df.head(PREVIEW_ROWS), hide_index=True)
+            
+            # Download section
+            st.divider()
+            if query_live:
+                # Live query results have no fingerprint, so their export isn't cached
+                export_version = None
+                export_batches = lambda: [pa.RecordBatch.from_pandas(display_df, preserve_index=False)]
+            else:
+                export_version = store.version()
+                export_version = f"{store.name}-{export_version}" if export_version else None
+                export_batches = lambda: store.iter_batches(selected_dates, selected_models, search)
+            export_controls(
+                "records_export",
+                export_version,
+                [sorted(selected_dates), sorted(selected_models), search],
+                export_batches,
+                "stored_records",
+                "📥 Download Results",
+                "Download filtered results"
+            )
+        else:
+            st.warning("📭 No records match the selected filters")
+    elif store.name == 'firestore':
+        st.info("💡 Click 'Sync Firestore Records' to fetch data from Firestore")
+    else:
+        st.info("💡 No stored records yet. Run some models first!")
+
+# Analytics Tab
+with analytics_tab:
+    analytics_dates, analytics_models = list_partitions()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        analytics_selected_dates = st.multiselect(
+            "📅 Filter by date",
+            options=analytics_dates,
+            key="analytics_dates"
+        )
+    with col2:
+        analytics_selected_models = st.multiselect(
+            "🤖 Filter by model",
+            options=analytics_models,
+            key="analytics_models"
+        )
+    
+    with st.spinner("Computing analytics..."):
+        analytics = cached_analytics(
+            dataset_version(),
+            tuple(analytics_selected_dates),
+            tuple(analytics_selected_models)
+        )
+    
+    if analytics is not None:
+        st.markdown("### ⏱️ Latency and Reliability by Model")
+        st.dataframe(analytics['per_model'], hide_index=True)
+        
+        per_date = analytics['per_date']
+        if 'p50_s' in per_date.columns and per_date['current_date'].nunique() > 1:
+            st.markdown("### 📅 Median Latency by Date")
+            st.line_chart(per_date.pivot(index='current_date', columns='model', values='p50_s'))
+        
+        with st.expander("Per-date breakdown"):
+            st.dataframe(per_date, hide_index=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("### ❌ Error Rate")
+            st.bar_chart(analytics['per_model'].set_index('model')['error_rate'])
+        with col2:
+            st.markdown("### 📏 Response Length (chars)")
+            st.bar_chart(analytics['length_histogram'])
+        
+        if not analytics['errors_by_type'].empty:
+            st.markdown("### Failure Reasons")
+            st.dataframe(analytics['errors_by_type'])
+        
+        st.markdown("### 🔁 Run-to-Run Variance")
+        if analytics['run_variance'].empty:
+            st.caption("No prompts were run more than once for the selected models")
+        else:
+            st.caption("Mean standard deviation across repeated runs of the same prompt")
+            st.dataframe(analytics['run_variance'], hide_index=True)
+    else:
+        st.info("💡 No local results available. Run some models first!")
+
+with compare_tab:
+    compare_dates, compare_models = list_partitions()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        compare_selected_dates = st.multiselect(
+            "📅 Filter by date",
+            options=compare_dates,
+            key="compare_dates"
+        )
+    with col2:
+        compare_selected_models = st.multiselect(
+            "🤖 Filter by model",
+            options=compare_models,
+            key="compare_models"
+        )
+    
+    with st.spinner("Comparing responses..."):
+        comparison = cached_comparison(
+            dataset_version(),
+            tuple(compare_selected_dates),
+            tuple(compare_selected_models)
+        )
     
-    if load_button:
-        if initialize_firebase():
-            with st.spinner("📡 Fetching records from Firestore..."):
-                records = get_all_firestore_records()
-                
-                if records:
-                    df = pd.DataFrame(records)
-                    
-                    # Convert timestamp to string for CSV export
-                    if 'timestamp' in df.columns:
-                        df['timestamp'] = df['timestamp'].astype(str)
-                    
-                    display_stats(df, "Firestore")
-                    
-                    # Create filter container
-                    filter_container = st.container()
-                    with filter_container:
-                        st.markdown("### 🔍 Filter Options")
-                        col1, col2 = st.columns(2)
-                        
-                        selected_dates = []
-                        selected_models = []
-                        
-                        with col1:
-                            if 'date' in df.columns:
-                                selected_dates = st.multiselect(
-                                    "📅 Filter by date",
-                                    options=sorted(df['date'].unique()),
-                                    help="Select one or more dates to filter results"
-                                )
-                        
-                        with col2:
-                            if 'model' in df.columns:
-                                selected_models = st.multiselect(
-                                    "🤖 Filter by model",
-                                    options=sorted(df['model'].unique()),
-                                    help="Select one or more models to filter results"
-                                )
-                    
-                    # Apply filters
-                    filtered_df = df.copy()
-                    if selected_dates:
-                        filtered_df = filtered_df[filtered_df['date'].isin(selected_dates)]
-                    if selected_models:
-                        filtered_df = filtered_df[filtered_df['model'].isin(selected_models)]
-                    
-                    # Show results
-                    display_df = filtered_df if (selected_dates or selected_models) else df
-                    
-                    st.markdown("### 📊 Results Preview")
-                    if selected_dates or selected_models:
-                        st.caption(f"Showing {len(display_df)} filtered results out of {len(df)} total records")
-                    st.dataframe(display_df, hide_index=True)
-                    
-                    # Download section
-                    st.divider()
-                    col1, col2 = st.columns([2, 1])
-                    with col1:
-                        firebase_filename = st.text_input(
-                            "Filename for download",
-                            value="firestore_records.csv",
-                            help="Name of the file to save the Firestore results to"
-                        )
-                    
-                    with col2:
-                        st.download_button(
-                            label="📥 Download Results",
-                            data=display_df.to_csv(index=False),
-                            file_name=firebase_filename,
-                            mime="text/csv",
-                            help="Download filtered results as a CSV file"
-                        )
-                else:
-                    st.warning("📭 No records found in Firestore database")
+    if comparison is not None:
+        st.caption(
+            f"Estimated word-overlap (MinHash Jaccard) similarity over {comparison['responses']} responses, "
+            "comparing responses to the same prompt on the same date"
+        )
+        matrix = comparison['matrix']
+        if not matrix.empty:
+            st.markdown("### 🟩 Similarity Between Models")
+            st.caption("The diagonal is each model's similarity to its own repeated runs")
+            cells = matrix.rename_axis(index='model', columns='other_model').stack().rename('similarity').reset_index()
+            st.altair_chart(
+                alt.Chart(cells).mark_rect().encode(
+                    x=alt.X('other_model:N', title=None),
+                    y=alt.Y('model:N', title=None),
+                    color=alt.Color('similarity:Q', scale=alt.Scale(domain=[0, 1])),
+                    tooltip=['model', 'other_model', alt.Tooltip('similarity:Q', format='.2f')]
+                ),
+                width="stretch"
+            )
+        
+        st.markdown("### 🔁 Run-to-Run Consistency")
+        if comparison['consistency'].empty:
+            st.caption("No prompts were run more than once on the same date for the selected models")
+        else:
+            st.dataframe(comparison['consistency'], hide_index=True)
+        
+        st.markdown("### ↔️ Most Divergent Prompts")
+        if comparison['divergence'].empty:
+            st.caption("Select at least two models to compare their responses")
         else:
-            st.error("❌ Failed to initialize Firebase. Please check your credentials.")
+            st.caption("Prompts whose responses differ most between models")
+            st.dataframe(comparison['divergence'].head(PREVIEW_ROWS), hide_index=True)
+        
+        drift = comparison['drift']
+        if not drift.empty:
+            st.markdown("### 📉 Drift Over Time")
+            st.caption("Similarity of each model's responses to its responses on the earliest selected date")
+            st.line_chart(drift.pivot(index='current_date', columns='model', values='similarity_to_first'))
     else:
-        st.info("💡 Click 'Load Firestore Records' to fetch data from Firestore")
+        st.info("💡 No local results available. Run some models first!")
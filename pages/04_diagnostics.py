@@ -0,0 +1,88 @@
+import streamlit as st
+import pandas as pd
+from jobs import list_jobs
+from tracing import TRACE_EXPORT, read_trace_records, stage_summary, traces_version
+
+st.set_page_config(page_title="Diagnostics", page_icon="🩺")
+st.title("Diagnostics")
+
+# Seconds between refreshes of the selected run's breakdown
+REFRESH_SECONDS = 5
+
+# Label for spans recorded outside any job, e.g. page loads in the app process
+APP_LABEL = "App (outside runs)"
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def cached_traces(version):
+    """Spans and counters of every trace file; reread only when a process has flushed"""
+    spans, counters = read_trace_records()
+    spans_df = pd.DataFrame(spans)
+    counters_df = pd.DataFrame(counters)
+    for df in (spans_df, counters_df):
+        if not df.empty:
+            df['run_id'] = df['run_id'].fillna(APP_LABEL)
+    return spans_df, counters_df
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def show_run(run_id):
+    spans_df, counters_df = cached_traces(traces_version())
+    run_spans = spans_df[spans_df['run_id'] == run_id]
+    if run_spans.empty:
+        st.info("No spans recorded for this run yet")
+        return
+
+    counters = {}
+    if not counters_df.empty:
+        counters = counters_df[counters_df['run_id'] == run_id].groupby('name')['value'].sum().to_dict()
+    job_spans = run_spans[run_spans['name'] == 'job']
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Job time (s)", f"{job_spans['duration_ms'].sum() / 1000:.1f}" if not job_spans.empty else "—")
+    with col2:
+        st.metric("Model calls", int(counters.get('model_calls', 0)))
+    with col3:
+        st.metric("Retries", int(counters.get('retries', 0)))
+    with col4:
+        st.metric("Cache hits", int(counters.get('cache_hits', 0)))
+
+    summary = stage_summary(run_spans)
+    st.markdown("### ⏱️ Time by Stage")
+    st.caption("self_s excludes nested stages; model calls overlap, so stage totals can exceed the job time")
+    st.bar_chart(summary[summary['name'] != 'job'].set_index('name')['self_s'])
+    st.dataframe(summary, hide_index=True)
+
+    if counters:
+        st.markdown("### 🔢 Counters")
+        st.dataframe(pd.Series(counters, name='value').rename_axis('counter').reset_index(), hide_index=True)
+
+if 'off' in TRACE_EXPORT or not TRACE_EXPORT:
+    st.info("💡 Tracing is disabled (LLM_TRACE_EXPORT=off)")
+elif 'file' not in TRACE_EXPORT:
+    st.info("💡 Spans are exported to OpenTelemetry only; set LLM_TRACE_EXPORT=file,otel to see them here")
+else:
+    spans_df, _ = cached_traces(traces_version())
+    if spans_df.empty:
+        st.info("💡 No spans recorded yet. Run some models first!")
+    else:
+        # Newest activity first; the app's own spans last
+        last_seen = spans_df.groupby('run_id')['end_time_unix_nano'].max().sort_values(ascending=False)
+        run_ids = [run_id for run_id in last_seen.index if run_id != APP_LABEL]
+        if APP_LABEL in last_seen.index:
+            run_ids.append(APP_LABEL)
+        running = {job['run_id'] for job in list_jobs() if job['status'] == 'running'}
+
+        selected_run = st.selectbox(
+            "Run",
+            run_ids,
+            format_func=lambda run_id: f"{run_id} (running)" if run_id in running else run_id
+        )
+        show_run(selected_run)
+
+        st.markdown("### 📚 Past Runs")
+        st.caption("Seconds spent in each stage (excluding nested stages) per run")
+        per_run = {
+            run_id: stage_summary(spans).set_index('name')['self_s']
+            for run_id, spans in spans_df.groupby('run_id')
+        }
+        st.dataframe(pd.DataFrame(per_run).T.loc[run_ids].fillna(0))
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+from collections import deque
+
+# Seconds between deliveries of coalesced progress to subscribers
+DEFAULT_INTERVAL_SECONDS = 1.0
+
+# Events held between deliveries; beyond this the oldest are dropped from the log and
+# per-model counts (done/total stay exact, as each event carries them)
+MAX_PENDING_EVENTS = 10000
+
+# Lines kept in the rolling log
+LOG_LINES = 50
+
+logger = logging.getLogger(__name__)
+
+class ProgressBus:
+    """Carries progress events from the executor to whatever displays them.
+
+    publish() only appends to a bounded deque, so the sweep never waits on a
+    slow consumer. A drain thread wakes every interval, coalesces whatever
+    arrived into one update and passes it to each subscriber. An update holds
+    the latest done/total, per-model counts, one status line per model that
+    made progress (also kept in a rolling log of LOG_LINES), the newest
+    partial response and the result rows received since the last update.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL_SECONDS, max_events=MAX_PENDING_EVENTS):
+        self.interval = interval
+        self.events = deque(maxlen=max_events)
+        self.subscribers = []
+        self.done = 0
+        self.total = 0
+        self.by_model = {}
+        self.log = deque(maxlen=LOG_LINES)
+        self.partial = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Call callback(update) from the drain thread after each interval with new events.
+
+        Exceptions from callback are logged and don't stop later updates.
+        """
+        self.subscribers.append(callback)
+
+    def publish(self, kind, **data):
+        """Queue an event: 'result' (result, done, total) or 'partial' (item, text)"""
+        self.events.append((kind, data))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._drain_forever, name="progress-bus", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the drain thread after delivering any remaining events"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._drain()
+
+    def _drain_forever(self):
+        while not self._stop.wait(self.interval):
+            self._drain()
+
+    def _drain(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        if not events:
+            return
+
+        rows = []
+        progressed = {}
+        for kind, data in events:
+            if kind == 'result':
+                result = data['result']
+                self.done, self.total = data['done'], data['total']
+                counts = self.by_model.setdefault(result['model'], {'done': 0, 'errors': 0})
+                step = progressed.setdefault(result['model'], {'done': 0, 'errors': 0})
+                failed = result.get('error_type') is not None
+                for tally in (counts, step):
+                    tally['done'] += 1
+                    tally['errors'] += failed
+                rows.append(result)
+            elif kind == 'partial':
+                item = data['item']
+                self.partial = f"{item['model']} (run {item['run']}): {data['text'][-500:]}"
+
+        timestamp = time.strftime('%H:%M:%S')
+        lines = []
+        for model, step in progressed.items():
+            errors = f", {step['errors']} failed" if step['errors'] else ""
+            lines.append(f"{timestamp} {model}: +{step['done']} ({self.by_model[model]['done']} total{errors})")
+        self.log.extend(lines)
+
+        update = {
+            'done': self.done,
+            'total': self.total,
+            'by_model': {model: dict(counts) for model, counts in self.by_model.items()},
+            'lines': lines,
+            'log': list(self.log),
+            'partial': self.partial,
+            'rows': rows,
+        }
+        for callback in self.subscribers:
+            # A failing subscriber (e.g. a locked database) must not end the drain thread;
+            # the next update carries the latest state again
+            try:
+                callback(update)
+            except Exception:
+                logger.exception("Progress subscriber %r failed", callback)
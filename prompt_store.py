@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PROMPT_SET_DIR = 'data/prompt_sets'
+CURRENT_PROMPT_SET_FILE = 'data/current_prompt_set.json'
+
+# Rows parsed per CSV chunk during ingestion, and per Parquet row group
+INGEST_CHUNK_ROWS = 50000
+ROW_GROUP_ROWS = 10000
+
+PROMPT_SCHEMA = pa.schema([
+    ('Prompt', pa.string()),
+    ('prompt_hash', pa.uint64()),
+])
+
+class PromptFileError(ValueError):
+    pass
+
+def content_hash(file_obj, block_size=1 << 20):
+    """sha256 of an uploaded file, read block by block; rewinds the file"""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(block_size), b''):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+def prompt_set_path(set_id, root=PROMPT_SET_DIR):
+    return os.path.join(root, f"{set_id}.parquet")
+
+def _metadata_path(set_id, root=PROMPT_SET_DIR):
+    return os.path.join(root, f"{set_id}.json")
+
+def _hash_prompts(prompts):
+    normalized = prompts.str.split().str.join(' ')
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+def ingest_prompt_file(file_obj, name=None, drop_duplicates=False, root=PROMPT_SET_DIR):
+    """Stream a prompt CSV into a content-addressed Parquet prompt set.
+
+    The CSV is parsed in chunks; the Prompt column is validated on the
+    first chunk and duplicate prompts (by whitespace-normalized hash) are
+    counted, and dropped when drop_duplicates is set. An upload whose
+    content was already ingested is not parsed again. Returns the set's metadata.
+    """
+    set_id = content_hash(file_obj) + ('-dedup' if drop_duplicates else '')
+    if os.path.exists(_metadata_path(set_id, root)):
+        return load_prompt_set_metadata(set_id, root)
+
+    os.makedirs(root, exist_ok=True)
+    path = prompt_set_path(set_id, root)
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    seen = set()
+    rows = 0
+    duplicates = 0
+    writer = None
+    try:
+        for chunk in pd.read_csv(file_obj, chunksize=INGEST_CHUNK_ROWS, dtype=str, keep_default_na=False):
+            if 'Prompt' not in chunk.columns:
+                raise PromptFileError("CSV file must contain a 'Prompt' column")
+            prompts = chunk['Prompt'].astype(str)
+            hashes = _hash_prompts(prompts)
+            keep = []
+            for prompt_hash in hashes:
+                duplicate = prompt_hash in seen
+                duplicates += duplicate
+                seen.add(prompt_hash)
+                keep.append(not (duplicate and drop_duplicates))
+            table = pa.table({'Prompt': prompts[keep].tolist(), 'prompt_hash': hashes[keep]}, schema=PROMPT_SCHEMA)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, PROMPT_SCHEMA, compression='zstd')
+            writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+            rows += table.num_rows
+    except Exception:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if writer is None:
+        raise PromptFileError("CSV file must contain a 'Prompt' column")
+    writer.close()
+    os.replace(tmp_path, path)
+
+    metadata = {
+        'set_id': set_id,
+        'name': name,
+        'rows': rows,
+        'duplicates': duplicates,
+        'duplicates_dropped': drop_duplicates,
+    }
+    with open(_metadata_path(set_id, root), 'w') as f:
+        json.dump(metadata, f)
+    return metadata
+
+def load_prompt_set_metadata(set_id, root=PROMPT_SET_DIR):
+    with open(_metadata_path(set_id, root)) as f:
+        return json.load(f)
+
+def set_current_prompt_set(set_id, path=CURRENT_PROMPT_SET_FILE):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'set_id': set_id}, f)
+
+def clear_current_prompt_set(path=CURRENT_PROMPT_SET_FILE):
+    if os.path.exists(path):
+        os.remove(path)
+
+def current_prompt_set(path=CURRENT_PROMPT_SET_FILE, legacy_csv=None, root=PROMPT_SET_DIR):
+    """Metadata of the prompt set selected for runs, importing a legacy prompts CSV once"""
+    if not os.path.exists(path) and legacy_csv and os.path.exists(legacy_csv):
+        with open(legacy_csv, 'rb') as f:
+            metadata = ingest_prompt_file(f, name=os.path.basename(legacy_csv), root=root)
+        set_current_prompt_set(metadata['set_id'], path)
+        os.replace(legacy_csv, f"{legacy_csv}.imported")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        set_id = json.load(f)['set_id']
+    if not os.path.exists(_metadata_path(set_id, root)):
+        return None
+    return load_prompt_set_metadata(set_id, root)
+
+def read_prompt_page(set_id, page, page_size, root=PROMPT_SET_DIR):
+    """One page of prompts, reading only the row groups that cover it"""
+    parquet_file = pq.ParquetFile(prompt_set_path(set_id, root))
+    start = page * page_size
+    stop = start + page_size
+    row_groups = []
+    first_row = None
+    offset = 0
+    for index in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(index).num_rows
+        if offset + group_rows > start and offset < stop:
+            row_groups.append(index)
+            if first_row is None:
+                first_row = offset
+        offset += group_rows
+    if not row_groups:
+        return pd.DataFrame(columns=['Prompt'])
+    table = parquet_file.read_row_groups(row_groups, columns=['Prompt'])
+    return table.slice(start - first_row, page_size).to_pandas()
+
+def iter_prompts(set_id, batch_size=ROW_GROUP_ROWS, root=PROMPT_SET_DIR):
+    """Yield prompts one by one, reading the set a batch at a time"""
+    parquet_file = pq.ParquetFile(prompt_set_path(set_id, root))
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=['Prompt']):
+        yield from batch.column(0).to_pylist()
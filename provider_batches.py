@@ -0,0 +1,218 @@
+import hashlib
+import json
+
+from executor import cell_id, result_row
+from jobs import JOBS_FILE, list_batches, record_batch, update_batch
+from rate_limit import classify_error
+from response_cache import model_params
+from utils import MODEL_PROVIDERS
+
+# Seconds a deferred job waits between checks of its provider batches
+BATCH_POLL_SECONDS = 60
+
+# Output token ceiling for batch requests to providers that require one
+DEFAULT_MAX_TOKENS = 1024
+
+# Generation parameters forwarded from the model client into batch requests
+BATCH_PARAMS = ("temperature", "top_p", "max_tokens", "seed")
+
+def batch_request_id(item):
+    """Request id of a work item within a batch; identical (run, prompt) items share one request"""
+    return f"r{item['run']}-{hashlib.sha1(str(item['prompt']).encode('utf-8')).hexdigest()[:16]}"
+
+def group_batch_items(items):
+    groups = {}
+    for item in items:
+        groups.setdefault(batch_request_id(item), []).append(item)
+    return groups
+
+def _batch_outcome(content, output_tokens=None):
+    return {
+        'response': content,
+        # Batched requests have no per-request latency
+        'time_seconds': None,
+        'error_type': None,
+        'attempts': 1,
+        'ttft_seconds': None,
+        'output_tokens': output_tokens,
+        'tokens_per_second': None
+    }
+
+def _batch_error(message, error_type='error'):
+    return {**_batch_outcome(f"Error: {message}"), 'error_type': error_type}
+
+class OpenAIBatch:
+    """OpenAI Batch API: a JSONL file of chat completion requests, answered within 24 hours"""
+
+    def __init__(self, model):
+        self.model = model
+        self.client = model.root_client
+
+    def submit(self, groups):
+        params = {name: value for name, value in model_params(self.model).items() if name in BATCH_PARAMS}
+        lines = [
+            json.dumps({
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': {
+                    'model': self.model.model_name,
+                    'messages': [{'role': 'user', 'content': str(items[0]['prompt'])}],
+                    **params
+                }
+            })
+            for custom_id, items in groups.items()
+        ]
+        upload = self.client.files.create(file=('requests.jsonl', '\n'.join(lines).encode('utf-8')), purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        return batch.id
+
+    def poll(self, batch_id):
+        """('pending' | 'ended' | 'failed', status message)"""
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in ('completed', 'expired', 'cancelled'):
+            # Expired and cancelled batches still return the requests they finished
+            return 'ended', batch.status
+        if batch.status == 'failed':
+            errors = getattr(batch.errors, 'data', None) or []
+            return 'failed', "; ".join(error.message for error in errors if error.message) or batch.status
+        return 'pending', batch.status
+
+    def results(self, batch_id):
+        """Yield (request id, outcome) for every request the batch answered"""
+        batch = self.client.batches.retrieve(batch_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get('response') or {}
+                body = response.get('body') or {}
+                if response.get('status_code') == 200:
+                    usage = body.get('usage') or {}
+                    content = body['choices'][0]['message'].get('content') or ""
+                    yield entry['custom_id'], _batch_outcome(content, usage.get('completion_tokens'))
+                else:
+                    error = entry.get('error') or body.get('error') or {}
+                    status = response.get('status_code')
+                    error_type = 'rate_limited' if status == 429 else 'server_error' if (status or 0) >= 500 else 'error'
+                    yield entry['custom_id'], _batch_error(error.get('message') or f"status {status}", error_type)
+
+class AnthropicBatch:
+    """Anthropic Message Batches API"""
+
+    def __init__(self, model):
+        import anthropic
+        self.model = model
+        self.client = anthropic.Anthropic(
+            api_key=model.anthropic_api_key.get_secret_value(),
+            base_url=model.anthropic_api_url
+        )
+
+    def submit(self, groups):
+        params = {name: value for name, value in model_params(self.model).items() if name in BATCH_PARAMS and name != 'seed'}
+        params.setdefault('max_tokens', DEFAULT_MAX_TOKENS)
+        batch = self.client.messages.batches.create(requests=[
+            {
+                'custom_id': custom_id,
+                'params': {
+                    'model': self.model.model,
+                    'messages': [{'role': 'user', 'content': str(items[0]['prompt'])}],
+                    **params
+                }
+            }
+            for custom_id, items in groups.items()
+        ])
+        return batch.id
+
+    def poll(self, batch_id):
+        batch = self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status == 'ended':
+            return 'ended', batch.processing_status
+        return 'pending', batch.processing_status
+
+    def results(self, batch_id):
+        for entry in self.client.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type == 'succeeded':
+                content = "".join(block.text for block in result.message.content if block.type == 'text')
+                yield entry.custom_id, _batch_outcome(content, result.message.usage.output_tokens)
+            elif result.type == 'errored':
+                error = getattr(result.error, 'error', None)
+                yield entry.custom_id, _batch_error(getattr(error, 'message', None) or result.type)
+            else:
+                # Canceled and expired requests are left for the live engine
+                continue
+
+# Provider -> batch API client; models of other providers always run on the live engine
+BATCH_BACKENDS = {
+    "openai": OpenAIBatch,
+    "anthropic": AnthropicBatch,
+}
+
+def supports_batches(model_name):
+    return MODEL_PROVIDERS.get(model_name) in BATCH_BACKENDS
+
+def advance_batches(job_id, run_id, models, deferred, record, path=JOBS_FILE):
+    """Submit, poll and import the provider batches of a deferred job.
+
+    deferred maps each batch-capable model to its remaining work items. A
+    model without a batch for this job gets one; a finished batch is imported
+    by passing a result row for each of its items to record. Items a batch
+    could not answer (failed requests, a failed submission or batch), and
+    items of batches finished earlier that are still incomplete, are
+    returned to be run on the live engine instead.
+
+    Returns (number of batches still running, work items for the live engine).
+    """
+    batches = {batch['model']: batch for batch in list_batches(job_id, path)}
+    pending = 0
+    fallback = []
+    for model_name, items in deferred.items():
+        backend = BATCH_BACKENDS[MODEL_PROVIDERS[model_name]](models[model_name])
+        batch = batches.get(model_name)
+        if batch is None:
+            groups = group_batch_items(items)
+            try:
+                batch_id = backend.submit(groups)
+            except Exception as e:
+                if classify_error(e) == 'auth':
+                    raise
+                fallback.extend(items)
+                continue
+            record_batch(batch_id, job_id, run_id, model_name, len(groups), path)
+            pending += 1
+            continue
+        if batch['status'] != 'submitted':
+            # Already imported or failed: whatever is still incomplete (e.g. a
+            # fallback cut short by a restart) runs on the live engine
+            fallback.extend(items)
+            continue
+
+        try:
+            state, message = backend.poll(batch['batch_id'])
+        except Exception as e:
+            # Transient: the next poll tries again
+            state, message = 'pending', str(e)
+        if state == 'pending':
+            update_batch(batch['batch_id'], path, message=message)
+            pending += 1
+            continue
+
+        succeeded = set()
+        if state == 'ended':
+            groups = group_batch_items(items)
+            for custom_id, outcome in backend.results(batch['batch_id']):
+                for item in groups.get(custom_id, ()):
+                    record(result_row(item, outcome))
+                    if outcome['error_type'] is None:
+                        succeeded.add(cell_id(item))
+        update_batch(batch['batch_id'], path, status='imported' if state == 'ended' else 'failed', message=message)
+        fallback.extend(item for item in items if cell_id(item) not in succeeded)
+    return pending, fallback
@@ -0,0 +1,148 @@
+import asyncio
+import random
+import time
+
+# Per-provider budgets. Set these to the limits of your account tier.
+PROVIDER_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 200000, "max_concurrency": 16},
+    "anthropic": {"rpm": 50, "tpm": 40000, "max_concurrency": 8},
+    "google": {"rpm": 360, "tpm": 120000, "max_concurrency": 8},
+    "xai": {"rpm": 60, "tpm": 100000, "max_concurrency": 8},
+    "groq": {"rpm": 30, "tpm": 6000, "max_concurrency": 4},
+}
+DEFAULT_LIMITS = {"rpm": 60, "tpm": 60000, "max_concurrency": 4}
+
+# Rough output budget charged against TPM before the real usage is known
+EXPECTED_OUTPUT_TOKENS = 512
+
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+RETRYABLE_ERRORS = {"rate_limited", "timeout", "server_error", "connection"}
+
+def estimate_tokens(text):
+    return max(1, len(str(text)) // 4)
+
+def _status_code(e):
+    for obj in (e, getattr(e, "response", None)):
+        code = getattr(obj, "status_code", None) or getattr(obj, "status", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+def classify_error(e):
+    """Label an exception from a provider SDK with a coarse failure reason"""
+    code = _status_code(e)
+    message = str(e).lower()
+    name = type(e).__name__.lower()
+    if code == 429 or "ratelimit" in name or "rate limit" in message or "429" in message:
+        return "rate_limited"
+    if code in (401, 403) or "authentication" in name or "permission" in name:
+        return "auth"
+    if isinstance(e, (asyncio.TimeoutError, TimeoutError)) or "timeout" in name:
+        return "timeout"
+    if (code is not None and code >= 500) or "overloaded" in message:
+        return "server_error"
+    if "connection" in name:
+        return "connection"
+    if code is not None and 400 <= code < 500:
+        return "bad_request"
+    return "error"
+
+def retry_after_seconds(e):
+    """Return the Retry-After delay requested by the provider, if any"""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter, never shorter than Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute up to a one-minute burst"""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount):
+        """Charge (or refund, if negative) tokens once the real cost is known"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+class ProviderLimiter:
+    """RPM/TPM budgets plus an AIMD concurrency window for one provider.
+
+    The window grows by one slot per window's worth of successes and halves
+    on every rate-limit response, so throughput settles just below the
+    provider's real limit.
+    """
+
+    def __init__(self, rpm, tpm, max_concurrency):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.limit = float(max(1, max_concurrency // 2))
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, estimated_tokens):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+        except BaseException:
+            # Cancelled while waiting on the budgets (e.g. the losing request
+            # of a hedge): give the slot back, since release() won't be called
+            async with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+            raise
+
+    async def release(self, error_type=None):
+        async with self.condition:
+            self.in_flight -= 1
+            if error_type == "rate_limited":
+                self.limit = max(1.0, self.limit / 2)
+            elif error_type is None:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+def build_limiters(providers, max_concurrency=None):
+    """Create one limiter per provider, optionally overriding the concurrency ceiling"""
+    limiters = {}
+    for provider in providers:
+        limits = dict(PROVIDER_LIMITS.get(provider, DEFAULT_LIMITS))
+        if max_concurrency and provider in max_concurrency:
+            limits["max_concurrency"] = max_concurrency[provider]
+        limiters[provider] = ProviderLimiter(**limits)
+    return limiters
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE_FILE = 'data/response_cache.sqlite'
+
+# Eviction budgets; least recently used entries go first
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 3600
+
+# Generation parameters that change a model's output and so belong in the key
+PARAM_ATTRIBUTES = ("temperature", "top_p", "top_k", "max_tokens", "max_output_tokens", "seed")
+
+def normalize_prompt(prompt):
+    return " ".join(str(prompt).split())
+
+def model_params(model):
+    """Collect the generation parameters set on a LangChain model"""
+    params = {}
+    for name in PARAM_ATTRIBUTES:
+        value = getattr(model, name, None)
+        if value is not None:
+            params[name] = value
+    return params
+
+def cache_key(model_id, prompt, params=None):
+    payload = json.dumps(
+        [model_id, normalize_prompt(prompt), params or {}],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """On-disk (SQLite) cache of successful model responses with LRU eviction"""
+
+    def __init__(self, path=CACHE_FILE, max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_id TEXT,
+                response TEXT,
+                time_seconds REAL,
+                created_at REAL,
+                accessed_at REAL,
+                size INTEGER
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        row = self.conn.execute(
+            "SELECT response, time_seconds, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[2] > self.max_age_seconds:
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.conn.commit()
+            return None
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        return {'response': row[0], 'time_seconds': row[1]}
+
+    def put(self, key, model_id, response, time_seconds):
+        now = time.time()
+        response = str(response)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, model_id, response, time_seconds, now, now, len(response.encode("utf-8")))
+        )
+        self.conn.commit()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        self.conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            freed = 0
+            stale = []
+            for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                stale.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM responses")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,307 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+RESULT_DIR = 'data/results'
+
+# Hive-style partition columns: data/results/current_date=.../model=.../part-<run_id>.parquet
+PARTITION_COLUMNS = ['current_date', 'model']
+
+# Full result schema; older files missing newer columns read back as nulls
+RESULT_SCHEMA = pa.schema([
+    ('model', pa.string()),
+    ('prompt', pa.string()),
+    ('run', pa.int64()),
+    ('prompt_index', pa.int64()),
+    ('response', pa.string()),
+    ('response_chars', pa.int64()),
+    ('time_seconds', pa.float64()),
+    ('current_date', pa.string()),
+    ('error_type', pa.string()),
+    ('attempts', pa.int64()),
+    ('cache_hit', pa.bool_()),
+    ('ttft_seconds', pa.float64()),
+    ('output_tokens', pa.int64()),
+    ('tokens_per_second', pa.float64()),
+    ('run_id', pa.string()),
+    ('hedged', pa.bool_()),
+    ('response_hash', pa.uint64()),
+    ('samples', pa.int64()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([RESULT_SCHEMA.field(name) for name in PARTITION_COLUMNS]),
+    flavor='hive'
+)
+
+FILE_SCHEMA = pa.schema([field for field in RESULT_SCHEMA if field.name not in PARTITION_COLUMNS])
+
+def _partition_dir(current_date, model, root=RESULT_DIR):
+    return os.path.join(root, f"current_date={current_date}", f"model={model}")
+
+def _write_atomic(table, path):
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+def _to_file_table(df):
+    df = df.reindex(columns=FILE_SCHEMA.names)
+    return pa.Table.from_pandas(df, schema=FILE_SCHEMA, preserve_index=False)
+
+def hash_responses(responses):
+    """Stable 64-bit hashes of response texts; keys for per-response caches such as similarity signatures"""
+    return pd.util.hash_pandas_object(responses.astype(str), index=False).to_numpy()
+
+def _prepare(result_df, run_id):
+    result_df = result_df.copy()
+    if 'run_id' not in result_df.columns:
+        result_df['run_id'] = run_id
+    result_df['run_id'] = result_df['run_id'].fillna(run_id)
+    # Derived here so analytics never has to read the response text
+    responses = result_df['response'].astype(str)
+    result_df['response_chars'] = responses.str.len()
+    result_df['response_hash'] = hash_responses(responses)
+    if 'error_type' not in result_df.columns:
+        result_df['error_type'] = None
+    result_df['error_type'] = result_df['error_type'].where(
+        result_df['error_type'].notna() | ~responses.str.startswith('Error:'), 'error'
+    )
+    return result_df
+
+def write_results(result_df, run_id=None, root=RESULT_DIR, part=None):
+    """Append one run's results as a new file in each (date, model) partition.
+
+    Each file is written to a temporary name and renamed into place, so
+    readers never see a partially written run. A run written in several
+    chunks passes a distinct part for each; rewriting the same part replaces it.
+    """
+    if result_df is None or result_df.empty:
+        return None
+    run_id = run_id or uuid.uuid4().hex
+    result_df = _prepare(result_df, run_id)
+    for (current_date, model), rows in result_df.groupby(PARTITION_COLUMNS, sort=False):
+        directory = _partition_dir(current_date, model, root)
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{run_id}.parquet" if part is None else f"part-{run_id}-{part}.parquet"
+        _write_atomic(_to_file_table(rows), os.path.join(directory, name))
+    return run_id
+
+def write_result_file(chunks, path, run_id=None):
+    """Write DataFrames of results to one standalone Parquet file (full RESULT_SCHEMA); returns rows written.
+
+    Used for results produced away from this store, e.g. a shard of a sweep
+    run on another machine, to be brought in later with merge_result_files.
+    """
+    run_id = run_id or uuid.uuid4().hex
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    rows = 0
+    with pq.ParquetWriter(tmp_path, RESULT_SCHEMA, compression='zstd') as writer:
+        for chunk in chunks:
+            chunk = _prepare(chunk, run_id).reindex(columns=RESULT_SCHEMA.names)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=RESULT_SCHEMA, preserve_index=False))
+            rows += len(chunk)
+    os.replace(tmp_path, path)
+    return rows
+
+def _dataset(root=RESULT_DIR):
+    if not os.path.isdir(root):
+        return None
+    files = [
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(root)
+        for name in names if name.endswith('.parquet')
+    ]
+    if not files:
+        return None
+    return ds.dataset(files, schema=RESULT_SCHEMA, format='parquet', partitioning=PARTITIONING,
+                      partition_base_dir=root)
+
+def _filter_expression(dates=None, models=None, where=None):
+    expression = where
+    for column, values in (('current_date', dates), ('model', models)):
+        if values:
+            condition = ds.field(column).isin(list(values))
+            expression = condition if expression is None else expression & condition
+    return expression
+
+def read_results(dates=None, models=None, columns=None, limit=None, root=RESULT_DIR, where=None):
+    """Read results, pruning partitions by date/model and reading only the given columns.
+
+    With a limit, scanning stops once that many rows have been read. where
+    is an optional further pyarrow dataset expression rows must match.
+    """
+    dataset = _dataset(root)
+    if dataset is None:
+        return None
+    if limit is not None:
+        table = dataset.head(limit, columns=columns, filter=_filter_expression(dates, models, where))
+    else:
+        table = dataset.to_table(columns=columns, filter=_filter_expression(dates, models, where))
+    return table.to_pandas()
+
+def count_results(dates=None, models=None, root=RESULT_DIR):
+    """Number of matching results, answered from Parquet metadata where possible"""
+    dataset = _dataset(root)
+    if dataset is None:
+        return 0
+    return dataset.count_rows(filter=_filter_expression(dates, models))
+
+def iter_result_batches(dates=None, models=None, columns=None, batch_size=10000, root=RESULT_DIR):
+    """Yield matching results as record batches, without materializing the whole table"""
+    dataset = _dataset(root)
+    if dataset is None:
+        return
+    yield from dataset.to_batches(columns=columns, filter=_filter_expression(dates, models), batch_size=batch_size)
+
+# Identifies one cell of a run across result files
+CELL_COLUMNS = ['run_id', 'model', 'run', 'prompt_index']
+
+def stored_cells(run_ids, root=RESULT_DIR):
+    """Cells of the given runs already in the store, with whether any of their results succeeded or failed"""
+    dataset = _dataset(root)
+    if dataset is None:
+        return pd.DataFrame(columns=CELL_COLUMNS + ['stored_ok', 'stored_failed'])
+    table = dataset.to_table(columns=CELL_COLUMNS + ['error_type'], filter=ds.field('run_id').isin(list(run_ids)))
+    cells = table.to_pandas()
+    cells['stored_ok'] = cells['error_type'].isna()
+    cells['stored_failed'] = ~cells['stored_ok']
+    return cells.groupby(CELL_COLUMNS, observed=True)[['stored_ok', 'stored_failed']].any().reset_index()
+
+def _remove_failed_results(cells, root=RESULT_DIR):
+    """Rewrite the store's files without the failed results of the given cells; returns rows removed"""
+    removed = 0
+    for model, model_cells in cells.groupby('model', sort=False):
+        keys = set(model_cells[['run_id', 'run', 'prompt_index']].itertuples(index=False, name=None))
+        for date_dir in os.listdir(root):
+            directory = os.path.join(root, date_dir, f"model={model}")
+            if not date_dir.startswith('current_date=') or not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.parquet'):
+                    continue
+                path = os.path.join(directory, name)
+                table = ds.dataset(path, schema=FILE_SCHEMA, format='parquet').to_table()
+                rows = table.select(['run_id', 'run', 'prompt_index', 'error_type']).to_pandas()
+                drop = rows['error_type'].notna() & pd.Series(
+                    [key in keys for key in rows[['run_id', 'run', 'prompt_index']].itertuples(index=False, name=None)],
+                    dtype=bool
+                )
+                if not drop.any():
+                    continue
+                if drop.all():
+                    os.remove(path)
+                else:
+                    _write_atomic(table.filter(pa.array(~drop.to_numpy())), path)
+                removed += int(drop.sum())
+    return removed
+
+def merge_result_files(paths, root=RESULT_DIR):
+    """Merge standalone result files (see write_result_file) into the store, one result per cell.
+
+    The store holds one row per cell of a merged sweep. Within the files a
+    successful result beats a failed one, then later files and rows beat
+    earlier ones. A cell the store already holds is skipped unless the store
+    only has a failure for it and the files have a success; the success then
+    replaces the stored failure. Merging overlapping shards, the same file
+    twice or a retry of failed cells therefore adds no duplicates. Only the
+    cell columns are read to pick rows; each file is then read once for the
+    rows it contributes. Returns rows written.
+    """
+    candidates = []
+    for file_number, path in enumerate(paths):
+        cells = pq.read_table(path, columns=CELL_COLUMNS + ['error_type']).to_pandas()
+        cells['file'] = file_number
+        cells['row'] = range(len(cells))
+        candidates.append(cells)
+    if not candidates:
+        return 0
+    candidates = pd.concat(candidates, ignore_index=True)
+    candidates['ok'] = candidates['error_type'].isna()
+    best = candidates.sort_values(['ok', 'file', 'row']).drop_duplicates(CELL_COLUMNS, keep='last')
+
+    stored = stored_cells(best['run_id'].unique(), root)
+    best = best.merge(stored, on=CELL_COLUMNS, how='left')
+    in_store = best['stored_ok'].notna()
+    stored_ok = best['stored_ok'].astype(bool) & in_store
+    stored_failed = best['stored_failed'].astype(bool) & in_store
+    # Failures superseded by a success, whether written now or by an earlier, interrupted merge
+    superseded = best[best['ok'] & stored_failed]
+    best = best[~(in_store & (stored_ok | ~best['ok']))]
+
+    # A fresh part name per merge, so nothing earlier merges wrote is replaced
+    merge_id = uuid.uuid4().hex[:12]
+    written = 0
+    for file_number, path in enumerate(paths):
+        rows = np.sort(best.loc[best['file'] == file_number, 'row'].to_numpy())
+        if not len(rows):
+            continue
+        df = pq.read_table(path).take(rows).to_pandas()
+        for run_id, run_rows in df.groupby('run_id', sort=False):
+            write_results(run_rows, run_id, root, part=f"merge-{merge_id}-{file_number}")
+        written += len(df)
+    # Removed only after the successes are written, so a crash never loses a cell
+    if not superseded.empty:
+        _remove_failed_results(superseded[CELL_COLUMNS], root)
+    return written
+
+def dataset_version(root=RESULT_DIR):
+    """Cheap fingerprint of the store's files; changes whenever results are written or compacted"""
+    entries = []
+    if os.path.isdir(root):
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                if name.endswith('.parquet'):
+                    stat = os.stat(os.path.join(dirpath, name))
+                    entries.append((dirpath, name, stat.st_size, stat.st_mtime_ns))
+    return hashlib.sha1(repr(sorted(entries)).encode()).hexdigest()
+
+def list_partitions(root=RESULT_DIR):
+    """Dates and models present in the store, from the directory layout alone"""
+    dates, models = set(), set()
+    if os.path.isdir(root):
+        for date_dir in os.listdir(root):
+            if not date_dir.startswith('current_date='):
+                continue
+            dates.add(date_dir.split('=', 1)[1])
+            for model_dir in os.listdir(os.path.join(root, date_dir)):
+                if model_dir.startswith('model='):
+                    models.add(model_dir.split('=', 1)[1])
+    return sorted(dates), sorted(models)
+
+def compact(root=RESULT_DIR):
+    """Merge each partition's run files into a single file; returns files removed"""
+    removed = 0
+    if not os.path.isdir(root):
+        return removed
+    for dirpath, _, names in os.walk(root):
+        parts = sorted(name for name in names if name.endswith('.parquet'))
+        if len(parts) < 2:
+            continue
+        paths = [os.path.join(dirpath, name) for name in parts]
+        table = ds.dataset(paths, schema=FILE_SCHEMA, format='parquet').to_table()
+        _write_atomic(table, os.path.join(dirpath, f"part-compacted-{uuid.uuid4().hex}.parquet"))
+        for path in paths:
+            os.remove(path)
+        removed += len(paths) - 1
+    return removed
+
+def import_csv(csv_path, root=RESULT_DIR):
+    """Load a legacy results CSV into the store and mark it as imported"""
+    if not os.path.exists(csv_path):
+        return False
+    legacy_df = pd.read_csv(csv_path)
+    write_results(legacy_df, run_id='legacy-csv', root=root)
+    os.replace(csv_path, f"{csv_path}.imported")
+    return True
+
+def clear(root=RESULT_DIR):
+    if os.path.isdir(root):
+        shutil.rmtree(root)
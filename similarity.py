@@ -0,0 +1,259 @@
+import glob
+import os
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from result_store import RESULT_DIR, hash_responses, read_results
+
+# Responses are compared as sets of word SHINGLE_WORDS-grams, estimated with
+# NUM_PERM MinHash values (standard error of a similarity around 0.5/sqrt(NUM_PERM))
+SHINGLE_WORDS = 3
+NUM_PERM = 64
+
+# Signatures are cached per response hash; changing the scheme starts a new cache
+SIGNATURE_DIR = os.path.join('data', 'signatures', f"w{SHINGLE_WORDS}-p{NUM_PERM}")
+
+# Cache files are merged into one once there are more than this many
+MAX_SIGNATURE_FILES = 20
+
+# Responses signed per vectorized pass, bounding memory for long responses
+SIGN_CHUNK_RESPONSES = 20000
+
+# Responses compared per (prompt, model, date); repeated runs beyond this are ignored
+MAX_SAMPLES_PER_CELL = 3
+
+# Pairs compared per vectorized pass
+PAIR_CHUNK = 200000
+
+COMPARE_COLUMNS = ['model', 'current_date', 'run', 'prompt', 'response_hash']
+
+SIGNATURE_SCHEMA = pa.schema([
+    ('response_hash', pa.uint64()),
+    ('signature', pa.binary(NUM_PERM * 4)),
+])
+
+# Multiply-shift hash functions; fixed so signatures stay valid across processes
+_rng = np.random.default_rng(20240617)
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_SHINGLE_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+_cache_lock = threading.Lock()
+_cache = {'files': None, 'hashes': np.empty(0, np.uint64), 'signatures': np.empty((0, NUM_PERM), np.uint32)}
+
+def _shingle_hashes(responses):
+    """(shingle hashes, position of the owning response) for every response.
+
+    Word hashes are combined with the hashes of the following words of the
+    same response, all as array operations. Responses shorter than
+    SHINGLE_WORDS words are represented by their words instead.
+    """
+    words = responses.reset_index(drop=True).astype(str).str.lower().str.split().explode().dropna()
+    owner = words.index.to_numpy()
+    word_hashes = pd.util.hash_pandas_object(words, index=False).to_numpy()
+    shingles = word_hashes.copy()
+    complete = np.ones(len(word_hashes), dtype=bool)
+    with np.errstate(over='ignore'):
+        for offset in range(1, SHINGLE_WORDS):
+            following = np.zeros_like(word_hashes)
+            following[:-offset] = word_hashes[offset:]
+            same_response = np.zeros(len(word_hashes), dtype=bool)
+            same_response[:-offset] = owner[offset:] == owner[:-offset]
+            shingles = shingles * _SHINGLE_MIX + following
+            complete &= same_response
+    has_shingles = np.bincount(owner[complete], minlength=len(responses)) > 0
+    short = ~has_shingles[owner]
+    keep = complete | short
+    return np.where(complete, shingles, word_hashes)[keep], owner[keep]
+
+def minhash_signatures(responses):
+    """MinHash signatures (len(responses) x NUM_PERM uint32) of a Series of response texts"""
+    signatures = np.full((len(responses), NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for start in range(0, len(responses), SIGN_CHUNK_RESPONSES):
+        shingles, owner = _shingle_hashes(responses.iloc[start:start + SIGN_CHUNK_RESPONSES])
+        if not len(shingles):
+            continue
+        # owner is sorted, so each response's shingles are one contiguous run
+        starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+        rows = start + owner[starts]
+        with np.errstate(over='ignore'):
+            for permutation in range(NUM_PERM):
+                permuted = ((shingles * _MULTIPLIERS[permutation] + _OFFSETS[permutation]) >> np.uint64(32)).astype(np.uint32)
+                signatures[rows, permutation] = np.minimum.reduceat(permuted, starts)
+    return signatures
+
+def _signature_files(root=SIGNATURE_DIR):
+    return sorted(glob.glob(os.path.join(root, '*.parquet')))
+
+def _load_cache(root=SIGNATURE_DIR):
+    """Cached (sorted hashes, signatures), reread only when the cache files change"""
+    files = tuple(_signature_files(root))
+    if _cache['files'] != files:
+        if files:
+            table = ds.dataset(list(files), schema=SIGNATURE_SCHEMA, format='parquet').to_table()
+            hashes = table['response_hash'].to_numpy()
+            column = table['signature'].combine_chunks()
+            signatures = np.frombuffer(column.buffers()[1], dtype=np.uint32)
+            signatures = signatures[column.offset * NUM_PERM:(column.offset + len(column)) * NUM_PERM].reshape(-1, NUM_PERM)
+            hashes, unique = np.unique(hashes, return_index=True)
+            signatures = signatures[unique]
+        else:
+            hashes, signatures = np.empty(0, np.uint64), np.empty((0, NUM_PERM), np.uint32)
+        _cache.update(files=files, hashes=hashes, signatures=signatures)
+    return _cache['hashes'], _cache['signatures']
+
+def _write_signatures(hashes, signatures, root=SIGNATURE_DIR):
+    os.makedirs(root, exist_ok=True)
+    table = pa.table({
+        'response_hash': pa.array(hashes, pa.uint64()),
+        'signature': pa.FixedSizeBinaryArray.from_buffers(
+            pa.binary(NUM_PERM * 4), len(hashes), [None, pa.py_buffer(np.ascontiguousarray(signatures).tobytes())]
+        ),
+    })
+    path = os.path.join(root, f"signatures-{uuid.uuid4().hex}.parquet")
+    pq.write_table(table, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+def _compact_cache(root=SIGNATURE_DIR):
+    files = _signature_files(root)
+    if len(files) <= MAX_SIGNATURE_FILES:
+        return
+    hashes, signatures = _load_cache(root)
+    _write_signatures(hashes, signatures, root)
+    for path in files:
+        os.remove(path)
+
+def signatures_for(hashes, load_responses, root=SIGNATURE_DIR):
+    """Signatures for response hashes, computing and caching only those not signed before.
+
+    load_responses(missing hashes) returns a DataFrame of response_hash and
+    response for the responses that still need signing.
+    """
+    with _cache_lock:
+        unique_hashes = np.unique(hashes)
+        cached_hashes, _ = _load_cache(root)
+        missing = unique_hashes[~np.isin(unique_hashes, cached_hashes)]
+        if len(missing):
+            new = load_responses(missing).drop_duplicates('response_hash')
+            _write_signatures(new['response_hash'].to_numpy(np.uint64), minhash_signatures(new['response']), root)
+            _compact_cache(root)
+        cached_hashes, cached_signatures = _load_cache(root)
+    if not len(cached_hashes):
+        return np.empty((len(hashes), NUM_PERM), np.uint32), np.zeros(len(hashes), dtype=bool)
+    positions = np.minimum(np.searchsorted(cached_hashes, hashes), len(cached_hashes) - 1)
+    return cached_signatures[positions], cached_hashes[positions] == hashes
+
+def load_comparable_results(dates=None, models=None, root=RESULT_DIR):
+    """Successful results to compare, at most MAX_SAMPLES_PER_CELL per (prompt, model, date), with their signatures.
+
+    Only cell and hash columns are read; response text is read just for
+    responses whose signature isn't cached (or whose hash predates the column).
+    """
+    succeeded = ds.field('error_type').is_null()
+    # Hashed and legacy rows are read apart, so a null hash never turns the column into floats
+    df = read_results(dates, models, COMPARE_COLUMNS, root=root, where=succeeded & ds.field('response_hash').is_valid())
+    if df is None:
+        return None, None
+    legacy_responses = read_results(dates, models, COMPARE_COLUMNS[:-1] + ['response'], root=root,
+                                    where=succeeded & ds.field('response_hash').is_null())
+    if not legacy_responses.empty:
+        # Results written before response hashes were stored
+        legacy_responses['response_hash'] = hash_responses(legacy_responses['response'])
+        df = pd.concat([df, legacy_responses.drop(columns='response')], ignore_index=True)
+    if df.empty:
+        return None, None
+    df['response_hash'] = df['response_hash'].astype(np.uint64)
+    df = df.sort_values('run').groupby(['prompt', 'model', 'current_date'], sort=False).head(MAX_SAMPLES_PER_CELL)
+    df = df.reset_index(drop=True)
+
+    def load_responses(missing):
+        frames = []
+        stored = read_results(dates, models, ['response_hash', 'response'], root=root,
+                              where=ds.field('response_hash').isin(pa.array(missing, pa.uint64())))
+        if stored is not None:
+            frames.append(stored)
+        if not legacy_responses.empty:
+            frames.append(legacy_responses[legacy_responses['response_hash'].isin(missing)])
+        return pd.concat(frames, ignore_index=True)
+
+    signatures, found = signatures_for(df['response_hash'].to_numpy(np.uint64), load_responses)
+    return df[found].reset_index(drop=True), signatures[found]
+
+def _pair_similarity(signatures, left, right):
+    """Estimated Jaccard similarity of each (left[i], right[i]) pair of signature rows"""
+    similarity = np.empty(len(left), dtype=np.float32)
+    for start in range(0, len(left), PAIR_CHUNK):
+        stop = start + PAIR_CHUNK
+        similarity[start:stop] = (signatures[left[start:stop]] == signatures[right[start:stop]]).mean(axis=1)
+    return similarity
+
+def compare_results(df, signatures):
+    """Cross-model similarity, run-to-run consistency, per-prompt divergence and drift over dates.
+
+    Responses are paired within each (prompt, date): pairs of different
+    models give the similarity matrix and prompt divergence, pairs of one
+    model's repeated runs its consistency. Drift compares each model's
+    responses with its own responses to the same prompt on the earliest date.
+    """
+    if df is None or df.empty:
+        return None
+    cells = pd.DataFrame({
+        'row': np.arange(len(df)),
+        'prompt': df['prompt'].astype('category').cat.codes,
+        'model': df['model'].astype('category'),
+        'current_date': df['current_date'],
+    })
+    pairs = cells.merge(cells, on=['prompt', 'current_date'], suffixes=('_a', '_b'))
+    pairs = pairs[pairs['row_a'] < pairs['row_b']]
+    pairs['similarity'] = _pair_similarity(signatures, pairs['row_a'].to_numpy(), pairs['row_b'].to_numpy())
+    same_model = pairs['model_a'].astype(str) == pairs['model_b'].astype(str)
+
+    cross = pairs[~same_model]
+    both_orders = pd.concat([
+        cross[['model_a', 'model_b', 'similarity']],
+        cross[['model_b', 'model_a', 'similarity']].set_axis(['model_a', 'model_b', 'similarity'], axis=1),
+    ])
+    matrix = both_orders.groupby(['model_a', 'model_b'], observed=True)['similarity'].mean().unstack()
+
+    consistency = (
+        pairs[same_model].groupby('model_a', observed=True)['similarity']
+        .agg(['mean', 'size']).rename(columns={'mean': 'run_similarity', 'size': 'pairs'})
+        .rename_axis('model').reset_index()
+    )
+    for model, row in consistency.set_index('model').iterrows():
+        if model in matrix.index:
+            matrix.loc[model, model] = row['run_similarity']
+
+    prompts = df['prompt'].astype('category').cat.categories
+    divergence = cross.groupby('prompt')['similarity'].agg(['mean', 'min', 'size'])
+    divergence.columns = ['mean_similarity', 'min_similarity', 'pairs']
+    divergence = divergence.sort_values('mean_similarity').reset_index()
+    divergence['prompt'] = prompts[divergence['prompt'].to_numpy()]
+
+    first_dates = cells.groupby('model', observed=True)['current_date'].transform('min')
+    baseline = cells[cells['current_date'] == first_dates]
+    later = cells[cells['current_date'] != first_dates]
+    drift_pairs = baseline.merge(later, on=['prompt', 'model'], suffixes=('_a', '_b'))
+    drift = pd.DataFrame(columns=['model', 'current_date', 'similarity_to_first'])
+    if not drift_pairs.empty:
+        drift_pairs['similarity'] = _pair_similarity(
+            signatures, drift_pairs['row_a'].to_numpy(), drift_pairs['row_b'].to_numpy()
+        )
+        drift = (
+            drift_pairs.groupby(['model', 'current_date_b'], observed=True)['similarity'].mean()
+            .rename('similarity_to_first').reset_index().rename(columns={'current_date_b': 'current_date'})
+        )
+
+    return {
+        'matrix': matrix,
+        'consistency': consistency,
+        'divergence': divergence,
+        'drift': drift,
+        'responses': len(df),
+    }
@@ -0,0 +1,434 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import pandas as pd
+import pyarrow as pa
+from firebase_admin import firestore
+
+from firebase_config import (
+    COLLECTION_NAME,
+    RECORD_FIELDS,
+    FirestoreBatchWriter,
+    _initialize_app,
+    iter_firestore_records_since,
+    query_firestore_records
+)
+
+# Where result records are written: 'firestore', 'sqlite' or 'file'
+STORAGE_BACKEND = os.environ.get("LLM_STORAGE_BACKEND", "firestore")
+
+# Seconds a backend health check result is reused before checking again
+HEALTH_TTL_SECONDS = 300
+
+SQLITE_RECORDS_FILE = 'data/records.sqlite'
+FILE_RECORDS_DIR = 'data/records'
+MIRROR_FILE = 'data/firestore_mirror.sqlite'
+
+# Records a writer buffers before writing them out, and the longest it holds them
+WRITE_BATCH_SIZE = 500
+WRITE_INTERVAL_SECONDS = 2.0
+
+RECORD_SCHEMA = pa.schema(
+    [('doc_id', pa.string())]
+    + [(field, pa.float64() if field == 'time_seconds' else pa.string()) for field in RECORD_FIELDS]
+)
+
+def _record_text(value):
+    """Timestamps as ISO text; Firestore returns datetimes"""
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+def _fts_query(search):
+    """Quote each search term so FTS5 treats the input as plain words, all of which must match"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in search.split())
+
+class BufferedRecordWriter:
+    """Collects records and hands them to write_batch in batches; same interface as FirestoreBatchWriter"""
+
+    def __init__(self, write_batch, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_INTERVAL_SECONDS):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.documents_written = 0
+        self.write_rpcs = 0
+        self.errors = []
+        self._deadline = time.monotonic() + flush_interval
+        self._lock = threading.Lock()
+
+    def add(self, data):
+        with self._lock:
+            self.pending.append(data)
+            if len(self.pending) >= self.batch_size or time.monotonic() >= self._deadline:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        records, self.pending = self.pending, []
+        self._deadline = time.monotonic() + self.flush_interval
+        if not records:
+            return
+        try:
+            self.write_batch(records)
+            self.write_rpcs += 1
+            self.documents_written += len(records)
+        except Exception as e:
+            self.errors.append(f"Failed to write {len(records)} records: {e}")
+
+class RecordStore:
+    """A place result records (RECORD_FIELDS plus a doc_id) are written to and queried from.
+
+    Subclasses implement check(), writer(), filter_options(), count(),
+    query(), iter_batches() and version(). Filters are lists of dates and
+    models plus an optional full-text search over responses.
+    """
+
+    name = None
+
+    def __init__(self):
+        self._health = None
+        self._health_lock = threading.Lock()
+
+    def check(self):
+        """Raise if the backend is unusable; otherwise return a short status message"""
+        raise NotImplementedError
+
+    def health(self, ttl=HEALTH_TTL_SECONDS):
+        """(ok, message) of the last check(), rechecked once it is older than ttl seconds"""
+        with self._health_lock:
+            if self._health is None or time.monotonic() - self._health[0] > ttl:
+                try:
+                    ok, message = True, self.check()
+                except Exception as e:
+                    ok, message = False, str(e)
+                self._health = (time.monotonic(), ok, message)
+            return self._health[1], self._health[2]
+
+class SQLiteRecordStore(RecordStore):
+    """Records in an indexed SQLite table, with an FTS5 index over responses.
+
+    Filters, counts and search run in SQL, so only previewed or exported
+    rows ever leave the database.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_RECORDS_FILE):
+        super().__init__()
+        self.path = path
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        # INSERT OR REPLACE only fires the delete trigger that keeps the FTS index in sync with this on
+        conn.execute("PRAGMA recursive_triggers = ON")
+        # Safe with WAL: a crash can lose the last commits but never corrupts the database
+        conn.execute("PRAGMA synchronous = NORMAL")
+        with self._ready_lock:
+            if not self._ready:
+                self._create_schema(conn)
+                self._ready = True
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{field} {'REAL' if field == 'time_seconds' else 'TEXT'}" for field in RECORD_FIELDS)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS records (doc_id TEXT PRIMARY KEY, {columns})")
+        # Tables created by earlier versions lack the newer fields
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(records)")}
+        for field in RECORD_FIELDS:
+            if field not in existing:
+                conn.execute(f"ALTER TABLE records ADD COLUMN {field} {'REAL' if field == 'time_seconds' else 'TEXT'}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records (timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_records_written_at ON records (written_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_records_date_model ON records (date, model)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_records_model ON records (model)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_records_run_id ON records (run_id)")
+
+        has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'records_fts'").fetchone()
+        conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(response, content='records', content_rowid='rowid');
+            CREATE TRIGGER IF NOT EXISTS records_fts_insert AFTER INSERT ON records BEGIN
+                INSERT INTO records_fts (rowid, response) VALUES (new.rowid, new.response);
+            END;
+            CREATE TRIGGER IF NOT EXISTS records_fts_delete AFTER DELETE ON records BEGIN
+                INSERT INTO records_fts (records_fts, rowid, response) VALUES ('delete', old.rowid, old.response);
+            END;
+            CREATE TRIGGER IF NOT EXISTS records_fts_update AFTER UPDATE ON records BEGIN
+                INSERT INTO records_fts (records_fts, rowid, response) VALUES ('delete', old.rowid, old.response);
+                INSERT INTO records_fts (rowid, response) VALUES (new.rowid, new.response);
+            END;
+        """)
+        if not has_fts:
+            # Index responses stored before the full-text index existed
+            conn.execute("INSERT INTO records_fts (records_fts) VALUES ('rebuild')")
+        conn.commit()
+
+    def _where(self, dates=None, models=None, search=None):
+        clauses = []
+        params = []
+        if dates:
+            clauses.append(f"date IN ({', '.join('?' * len(dates))})")
+            params.extend(dates)
+        if models:
+            clauses.append(f"model IN ({', '.join('?' * len(models))})")
+            params.extend(models)
+        if search and search.strip():
+            clauses.append("rowid IN (SELECT rowid FROM records_fts WHERE records_fts MATCH ?)")
+            params.append(_fts_query(search))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def check(self):
+        with closing(self._connect()) as conn:
+            conn.execute("SELECT 1 FROM records LIMIT 1").fetchall()
+        return f"SQLite database at {self.path}"
+
+    def insert(self, records):
+        """Insert or replace records (dicts of RECORD_FIELDS; doc_id defaults to the record id)"""
+        names = ['doc_id'] + RECORD_FIELDS
+        rows = [
+            [record.get('doc_id') or record.get('id')] + [
+                _record_text(record.get(field)) if field in ('timestamp', 'written_at') else record.get(field)
+                for field in RECORD_FIELDS
+            ]
+            for record in records
+        ]
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO records ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                rows
+            )
+            conn.commit()
+
+    def writer(self):
+        return BufferedRecordWriter(self.insert)
+
+    def last_written_at(self):
+        """Newest Firestore commit time mirrored, or None if no mirrored record has one"""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT MAX(written_at) FROM records").fetchone()[0]
+
+    def filter_options(self):
+        """Distinct dates and models, read from the indexes"""
+        with closing(self._connect()) as conn:
+            dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM records WHERE date IS NOT NULL ORDER BY date")]
+            models = [row[0] for row in conn.execute("SELECT DISTINCT model FROM records WHERE model IS NOT NULL ORDER BY model")]
+        return dates, models
+
+    def count(self, dates=None, models=None, search=None):
+        where, params = self._where(dates, models, search)
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM records{where}", params).fetchone()[0]
+
+    def query(self, dates=None, models=None, search=None, columns=None, limit=None):
+        """Matching records as a DataFrame, oldest first; only the requested columns are read"""
+        where, params = self._where(dates, models, search)
+        sql = f"SELECT {', '.join(columns) if columns else '*'} FROM records{where} ORDER BY timestamp"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def iter_batches(self, dates=None, models=None, search=None, chunk_rows=10000):
+        """Yield matching records as record batches, chunk_rows at a time"""
+        where, params = self._where(dates, models, search)
+        sql = f"SELECT {', '.join(RECORD_SCHEMA.names)} FROM records{where} ORDER BY timestamp"
+        with closing(self._connect()) as conn:
+            for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunk_rows):
+                yield pa.RecordBatch.from_pandas(chunk, schema=RECORD_SCHEMA, preserve_index=False)
+
+    def version(self):
+        """Fingerprint of the database files; changes whenever records are written"""
+        stats = []
+        for path in (self.path, f"{self.path}-wal"):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                stats.append(f"{stat.st_size}-{stat.st_mtime_ns}")
+        return ":".join(stats) or None
+
+class FileRecordStore(RecordStore):
+    """Records as JSON lines, one file per date; needs nothing but a writable directory.
+
+    Date filters pick files; everything else is a chunked scan, so this
+    suits small stores and environments without a database.
+    """
+
+    name = 'file'
+
+    def __init__(self, root=FILE_RECORDS_DIR, chunk_rows=10000):
+        super().__init__()
+        self.root = root
+        self.chunk_rows = chunk_rows
+
+    def _path(self, date):
+        return os.path.join(self.root, f"records-{date}.jsonl")
+
+    def _dates(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name[len('records-'):-len('.jsonl')]
+            for name in os.listdir(self.root)
+            if name.startswith('records-') and name.endswith('.jsonl')
+        )
+
+    def check(self):
+        os.makedirs(self.root, exist_ok=True)
+        if not os.access(self.root, os.W_OK):
+            raise PermissionError(f"{self.root} is not writable")
+        return f"JSON lines files in {self.root}"
+
+    def insert(self, records):
+        os.makedirs(self.root, exist_ok=True)
+        by_date = {}
+        for record in records:
+            record = {'doc_id': record.get('doc_id') or record.get('id'), **{field: record.get(field) for field in RECORD_FIELDS}}
+            by_date.setdefault(record['date'], []).append(json.dumps(record, default=str) + "\n")
+        for date, lines in by_date.items():
+            with open(self._path(date), 'a') as f:
+                f.write("".join(lines))
+
+    def writer(self):
+        return BufferedRecordWriter(self.insert)
+
+    def _frames(self, dates=None, models=None, search=None):
+        for date in self._dates():
+            if dates and date not in dates:
+                continue
+            for chunk in pd.read_json(self._path(date), lines=True, chunksize=self.chunk_rows, dtype=False):
+                chunk = chunk.reindex(columns=RECORD_SCHEMA.names)
+                if models:
+                    chunk = chunk[chunk['model'].isin(models)]
+                if search and search.strip():
+                    responses = chunk['response'].astype(str).str.lower()
+                    for term in search.lower().split():
+                        chunk = chunk[responses.loc[chunk.index].str.contains(term, regex=False)]
+                if not chunk.empty:
+                    yield chunk
+
+    def filter_options(self):
+        models = set()
+        for chunk in self._frames():
+            models.update(chunk['model'].dropna().unique())
+        return self._dates(), sorted(models)
+
+    def count(self, dates=None, models=None, search=None):
+        return sum(len(chunk) for chunk in self._frames(dates, models, search))
+
+    def query(self, dates=None, models=None, search=None, columns=None, limit=None):
+        frames = []
+        rows = 0
+        for chunk in self._frames(dates, models, search):
+            frames.append(chunk[columns] if columns else chunk)
+            rows += len(chunk)
+            if limit is not None and rows >= limit:
+                break
+        if not frames:
+            return pd.DataFrame(columns=columns or RECORD_SCHEMA.names)
+        df = pd.concat(frames, ignore_index=True)
+        return df.head(limit) if limit is not None else df
+
+    def iter_batches(self, dates=None, models=None, search=None, chunk_rows=None):
+        for chunk in self._frames(dates, models, search):
+            chunk = chunk.astype({name: 'object' for name in RECORD_SCHEMA.names if name != 'time_seconds'})
+            chunk = chunk.where(chunk.notna(), None)
+            for name in RECORD_SCHEMA.names:
+                if name != 'time_seconds':
+                    chunk[name] = chunk[name].map(lambda value: None if value is None else str(value))
+            yield pa.RecordBatch.from_pandas(chunk, schema=RECORD_SCHEMA, preserve_index=False)
+
+    def version(self):
+        entries = []
+        for date in self._dates():
+            stat = os.stat(self._path(date))
+            entries.append((date, stat.st_size, stat.st_mtime_ns))
+        return hashlib.sha1(repr(entries).encode()).hexdigest() if entries else None
+
+class FirestoreRecordStore(RecordStore):
+    """Records in Firestore, read back through a local SQLite mirror synced incrementally"""
+
+    name = 'firestore'
+
+    def __init__(self, mirror_path=MIRROR_FILE):
+        super().__init__()
+        self.mirror = SQLiteRecordStore(mirror_path)
+
+    def check(self):
+        _initialize_app()
+        firestore.client().collection(COLLECTION_NAME).limit(1).get()
+        return "Connected to Firestore"
+
+    def writer(self):
+        return FirestoreBatchWriter()
+
+    def sync(self, page_size=1000, client=None):
+        """Copy documents committed since the newest mirrored one into the mirror; returns the number fetched.
+
+        Syncing on the server's commit time rather than the result timestamp
+        means documents committed late, or by writers with other clocks, are
+        never skipped. The overlap re-read each time is replaced in place.
+        """
+        fetched = 0
+        batch = []
+        for record in iter_firestore_records_since(self.mirror.last_written_at(), page_size, client):
+            batch.append(record)
+            if len(batch) >= page_size:
+                self.mirror.insert(batch)
+                fetched += len(batch)
+                batch = []
+        if batch:
+            self.mirror.insert(batch)
+            fetched += len(batch)
+        return fetched
+
+    def query_live(self, dates=None, models=None):
+        """Run the filtered query against Firestore itself instead of the mirror"""
+        records = query_firestore_records(dates, models)
+        if not records:
+            return None
+        df = pd.DataFrame(records)
+        df['timestamp'] = df['timestamp'].astype(str)
+        return df
+
+    def filter_options(self):
+        return self.mirror.filter_options()
+
+    def count(self, dates=None, models=None, search=None):
+        return self.mirror.count(dates, models, search)
+
+    def query(self, dates=None, models=None, search=None, columns=None, limit=None):
+        return self.mirror.query(dates, models, search, columns, limit)
+
+    def iter_batches(self, dates=None, models=None, search=None, chunk_rows=10000):
+        return self.mirror.iter_batches(dates, models, search, chunk_rows)
+
+    def version(self):
+        return self.mirror.version()
+
+BACKENDS = {
+    'firestore': FirestoreRecordStore,
+    'sqlite': SQLiteRecordStore,
+    'file': FileRecordStore,
+}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_storage(name=None):
+    """The process-wide record store for a backend (STORAGE_BACKEND by default)"""
+    name = name or STORAGE_BACKEND
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = BACKENDS[name]()
+        return _stores[name]
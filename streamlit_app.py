@@ -27,12 +27,16 @@ st.markdown("""
 2. **Run Models** (🚀)
    - Select which models to run
    - Set the number of runs per prompt
-   - Monitor progress in real-time
+   - Submit the run as a background job and monitor its progress
 
 3. **Download Results** (📥)
    - Access both local and Firestore results
    - Filter and download results as needed
    - Clear old results when desired
+
+4. **Diagnostics** (🩺)
+   - See where each run spent its time, stage by stage
+   - Compare stage timings and counters across past runs
 """)
 
 # Additional information
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+# Keep test runs from writing trace files into the working tree
+os.environ.setdefault("LLM_TRACE_EXPORT", "off")
+
+import rate_limit
+import storage
+import utils
+from fake_provider import start_fake_provider
+
+# Seconds until a fake provider batch finishes
+BATCH_DELAY = 0.2
+
+@pytest.fixture
+def fake_model(tmp_path, monkeypatch):
+    """A gpt-4o-mini client pointed at a fake provider, with all app data under tmp_path"""
+    from langchain_openai import ChatOpenAI
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "file")
+    monkeypatch.setattr(storage, "_stores", {})
+    monkeypatch.setattr(rate_limit, "BACKOFF_BASE_SECONDS", 0.01)
+    server = start_fake_provider({"latency": 0.01, "latency_sigma": 0.1, "batch_delay": BATCH_DELAY})
+    model = ChatOpenAI(model="gpt-4o-mini", base_url=server.base_url, api_key="fake")
+    monkeypatch.setattr(utils, "_model_clients", {"gpt-4o-mini": model})
+    yield server
+    server.shutdown()
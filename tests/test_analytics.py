@@ -0,0 +1,29 @@
+import pandas as pd
+
+from analytics import compute_analytics
+
+def test_run_variance_only_compares_runs_of_the_same_sweep():
+    df = pd.DataFrame({
+        'model': 'm', 'current_date': '2026-10-17',
+        'run_id': ['a', 'a', 'b'], 'prompt_index': 0, 'run': [1, 2, 1],
+        'time_seconds': [1.0, 2.0, 30.0], 'error_type': None, 'response_chars': [10, 20, 900],
+        'ttft_seconds': None, 'tokens_per_second': None, 'cache_hit': False, 'hedged': False,
+    })
+    run_variance = compute_analytics(df)['run_variance'].set_index('model')
+    assert run_variance.loc['m', 'prompts'] == 1
+    assert run_variance.loc['m', 'chars_std'] == pd.Series([10, 20]).std()
+
+def test_runs_of_one_n_completion_call_count_as_one_call():
+    df = pd.DataFrame({
+        'model': 'm', 'current_date': '2026-10-17',
+        'run_id': 'a', 'prompt_index': [0, 0, 0, 1, 1], 'run': [1, 2, 3, 1, 2],
+        'time_seconds': [9.0, 9.0, 9.0, 1.0, 3.0], 'error_type': None, 'response_chars': [10, 20, 30, 40, 50],
+        'ttft_seconds': None, 'tokens_per_second': None, 'cache_hit': False, 'hedged': False,
+        'samples': [3, 3, 3, 1, 1],
+    })
+    analytics = compute_analytics(df)
+    per_model = analytics['per_model'].set_index('model')
+    assert per_model.loc['m', 'mean_s'] == (9.0 + 1.0 + 3.0) / 3
+    run_variance = analytics['run_variance'].set_index('model')
+    assert run_variance.loc['m', 'prompts'] == 1
+    assert run_variance.loc['m', 'latency_std_s'] == pd.Series([1.0, 3.0]).std()
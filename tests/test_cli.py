@@ -0,0 +1,26 @@
+import cli
+import storage
+
+def _run(tmp_path, *extra):
+    prompts = tmp_path / "prompts.csv"
+    prompts.write_text("Prompt\nhello\n")
+    return cli.main(["run", "--prompts", str(prompts), "--models", "gpt-4o-mini", *extra])
+
+def test_run_fails_when_the_record_store_is_unavailable(fake_model, tmp_path, monkeypatch, capsys):
+    store = storage.get_storage()
+    monkeypatch.setattr(store, "check", lambda: "ok")
+    store.health()
+
+    def broken():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "check", broken)
+    assert _run(tmp_path) == 1
+    assert "disk full" in capsys.readouterr().err
+
+def test_run_without_records_ignores_the_record_store(fake_model, tmp_path, monkeypatch):
+    def broken():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage.get_storage(), "check", broken)
+    assert _run(tmp_path, "--no-records") == 0
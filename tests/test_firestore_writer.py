@@ -0,0 +1,52 @@
+import firebase_config
+from firebase_config import FirestoreBatchWriter
+
+class _Batch:
+    def __init__(self, client):
+        self.client = client
+        self.refs = []
+
+    def set(self, ref, data):
+        self.refs.append(ref)
+
+    def commit(self):
+        self.client.commits.append(self.refs)
+        if len(self.client.commits) <= self.client.failures:
+            raise TimeoutError("deadline exceeded")
+
+class _Client:
+    def __init__(self, failures=0, document=None):
+        self.failures = failures
+        self.commits = []
+        if document is not None:
+            self.document = document
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id=None):
+        return doc_id
+
+    def batch(self):
+        return _Batch(self)
+
+def test_retried_commit_reuses_document_ids(monkeypatch):
+    monkeypatch.setattr(firebase_config.time, "sleep", lambda seconds: None)
+    client = _Client(failures=1)
+    writer = FirestoreBatchWriter(client=client, flush_interval=0.01)
+    writer.add({'id': 'a'})
+    writer.add({'id': 'b'})
+    writer.close()
+    assert client.commits == [['a', 'b'], ['a', 'b']]
+    assert (writer.documents_written, writer.errors) == (2, [])
+
+def test_failure_building_references_is_reported(monkeypatch):
+    monkeypatch.setattr(firebase_config.time, "sleep", lambda seconds: None)
+
+    def document(doc_id=None):
+        raise ValueError("bad document id")
+
+    writer = FirestoreBatchWriter(client=_Client(document=document), flush_interval=0.01, max_retries=1)
+    writer.add({'id': 'a'})
+    writer.close()
+    assert len(writer.errors) == 1 and "bad document id" in writer.errors[0]
@@ -0,0 +1,79 @@
+import io
+import time
+
+import storage
+import utils
+from conftest import BATCH_DELAY
+from jobs import get_job, run_job, submit_job
+from journal import RunJournal
+from prompt_store import ingest_prompt_file
+
+def _job(prompts, run_count=1, **options):
+    prompt_set = ingest_prompt_file(io.BytesIO(("Prompt\n" + "\n".join(prompts)).encode()), name="prompts.csv")
+    journal = RunJournal.create(prompt_set['set_id'], ["gpt-4o-mini"], run_count)
+    return journal, submit_job(journal.run_id, options)
+
+def test_deferred_job_falls_back_to_live_calls_for_failed_batch_requests(fake_model):
+    journal, job_id = _job([f"prompt {i}" for i in range(5)], run_count=2, deferred=True)
+
+    # Every batched request fails, then live calls succeed
+    fake_model.config["error_rate"] = 1.0
+    run_job(get_job(job_id))
+    assert get_job(job_id)['status'] == 'waiting'
+    assert fake_model.counters["errors"] == 10
+
+    fake_model.config["error_rate"] = 0.0
+    time.sleep(BATCH_DELAY)
+    run_job(get_job(job_id))
+    assert get_job(job_id)['status'] == 'complete'
+    assert len(journal.completed_cells()) == 10
+
+def test_incomplete_items_of_a_finished_batch_run_live_on_resume(fake_model, monkeypatch):
+    journal, job_id = _job([f"prompt {i}" for i in range(3)], deferred=True)
+
+    fake_model.config["error_rate"] = 1.0
+    run_job(get_job(job_id))
+    time.sleep(BATCH_DELAY)
+    # The live fallback fails too, as if it had been cut short
+    with monkeypatch.context() as patch:
+        patch.setattr(utils, "MAX_RETRIES", 0)
+        run_job(get_job(job_id))
+    assert len(journal.completed_cells()) == 0
+
+    fake_model.config["error_rate"] = 0.0
+    run_job(get_job(job_id))
+    assert get_job(job_id)['status'] == 'complete'
+    assert len(journal.completed_cells()) == 3
+
+def test_job_rechecks_and_reports_an_unavailable_record_store(fake_model, monkeypatch):
+    store = storage.get_storage()
+
+    def broken():
+        raise OSError("disk full")
+
+    # A cached failure from earlier doesn't outlive the problem
+    monkeypatch.setattr(store, "check", broken)
+    store.health()
+    monkeypatch.setattr(store, "check", lambda: "ok")
+    journal, job_id = _job(["prompt"])
+    run_job(get_job(job_id))
+    job = get_job(job_id)
+    assert (job['status'], job['error']) == ('complete', None)
+    assert store.count() == 1
+
+    monkeypatch.setattr(store, "check", broken)
+    store.health(ttl=0)
+    journal, job_id = _job(["another prompt"])
+    run_job(get_job(job_id))
+    job = get_job(job_id)
+    assert job['status'] == 'complete'
+    assert "disk full" in job['error']
+
+def test_only_missing_job_total_counts_only_uncached_calls(fake_model):
+    journal, job_id = _job(["cached prompt"], use_cache=True)
+    run_job(get_job(job_id))
+
+    journal, job_id = _job(["cached prompt", "new prompt"], use_cache=True, only_missing=True)
+    run_job(get_job(job_id))
+    job = get_job(job_id)
+    assert (job['status'], job['done'], job['total']) == ('complete', 1, 1)
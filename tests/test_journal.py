@@ -0,0 +1,18 @@
+from journal import RunJournal
+
+def _row(prompt_index, error_type=None):
+    return {'run': 1, 'model': 'm', 'prompt': f'p{prompt_index}', 'prompt_index': prompt_index,
+            'response': 'fine', 'error_type': error_type}
+
+def test_append_after_a_crash_mid_line_keeps_later_results(tmp_path):
+    journal = RunJournal('run', root=str(tmp_path))
+    (tmp_path / 'run').mkdir()
+    journal.append(_row(0))
+    journal.close()
+    with open(journal.results_path, 'a') as f:
+        f.write('{"run": 1, "model": "m", "prom')
+
+    resumed = RunJournal('run', root=str(tmp_path))
+    resumed.append(_row(1))
+    resumed.close()
+    assert resumed.completed_cells() == {'1:m:0', '1:m:1'}
@@ -0,0 +1,24 @@
+import time
+
+from progress_bus import ProgressBus
+
+def _result(model='m'):
+    return {'model': model, 'error_type': None}
+
+def test_failing_subscriber_does_not_stop_later_updates():
+    bus = ProgressBus(interval=0.01)
+    delivered = []
+
+    def flaky(update):
+        delivered.append(update['done'])
+        if len(delivered) == 1:
+            raise RuntimeError("database is locked")
+
+    bus.subscribe(flaky)
+    bus.publish('result', result=_result(), done=1, total=2)
+    time.sleep(0.1)
+    bus.publish('result', result=_result(), done=2, total=2)
+    time.sleep(0.1)
+    assert bus._thread.is_alive()
+    bus.close()
+    assert delivered == [1, 2]
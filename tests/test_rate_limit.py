@@ -0,0 +1,35 @@
+import asyncio
+
+from rate_limit import ProviderLimiter
+from utils import _hedged_attempt
+
+def test_cancelled_hedge_waiting_on_budget_releases_its_slot():
+    async def scenario():
+        limiter = ProviderLimiter(rpm=6, tpm=100000, max_concurrency=4)
+        # One request left in the bucket: the hedge has to wait ~10s for the next
+        limiter.requests.tokens = 1.0
+
+        async def slow_call(start_time):
+            await asyncio.sleep(0.5)
+            return "done", 0
+
+        result = await _hedged_attempt(slow_call, 10, limiter, 10, 0.2)
+        await asyncio.sleep(0.05)
+        return result, limiter.in_flight
+
+    (value, _, error, _, hedged), in_flight = asyncio.run(scenario())
+    assert (value, error, hedged) == ("done", None, True)
+    assert in_flight == 0
+
+def test_cancelled_acquire_releases_its_slot():
+    async def scenario():
+        limiter = ProviderLimiter(rpm=6, tpm=100000, max_concurrency=4)
+        limiter.requests.tokens = 0.0
+        task = asyncio.ensure_future(limiter.acquire(10))
+        await asyncio.sleep(0.05)
+        assert limiter.in_flight == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return limiter.in_flight
+
+    assert asyncio.run(scenario()) == 0
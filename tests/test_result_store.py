@@ -0,0 +1,36 @@
+import pandas as pd
+
+from result_store import merge_result_files, read_results, write_result_file
+
+def _result(error_type=None, run=1, prompt_index=0):
+    return pd.DataFrame([{
+        'model': 'm', 'prompt': f'p{prompt_index}', 'run': run, 'prompt_index': prompt_index,
+        'response': 'Error: timed out' if error_type else 'fine', 'time_seconds': 1.0,
+        'current_date': '2026-10-17', 'error_type': error_type,
+    }])
+
+def _merge(tmp_path, name, df):
+    path = str(tmp_path / f"{name}.parquet")
+    write_result_file([df], path, 'sweep1')
+    return merge_result_files([path], root=str(tmp_path / 'results'))
+
+def _stored(tmp_path):
+    return read_results(root=str(tmp_path / 'results')).sort_values(['run', 'prompt_index'])
+
+def test_retried_success_replaces_stored_failure(tmp_path):
+    _merge(tmp_path, 'first', pd.concat([_result('timeout'), _result(prompt_index=1)]))
+    _merge(tmp_path, 'retry', _result())
+
+    stored = _stored(tmp_path)
+    assert len(stored) == 2
+    assert stored['error_type'].isna().all()
+
+def test_merging_keeps_one_row_per_cell(tmp_path):
+    _merge(tmp_path, 'first', _result())
+    assert _merge(tmp_path, 'again', _result()) == 0
+    assert _merge(tmp_path, 'failed', _result('timeout')) == 0
+    _merge(tmp_path, 'failed_other', _result('timeout', run=2))
+    assert _merge(tmp_path, 'failed_again', _result('server_error', run=2)) == 0
+
+    stored = _stored(tmp_path)
+    assert list(zip(stored['run'], stored['error_type'].fillna('ok'))) == [(1, 'ok'), (2, 'timeout')]
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+from storage import FirestoreRecordStore
+
+class _Doc:
+    def __init__(self, data):
+        self.id = data['id']
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class _Query:
+    """Just enough of a Firestore query for FirestoreRecordStore.sync"""
+
+    def __init__(self, docs, since=None, after=None, size=None):
+        self.docs, self.since, self.after, self.size = docs, since, after, size
+
+    def collection(self, name):
+        return self
+
+    def where(self, field, op, value):
+        assert (field, op) == ('written_at', '>=')
+        return _Query(self.docs, value, self.after, self.size)
+
+    def order_by(self, field):
+        return _Query(sorted(self.docs, key=lambda doc: doc['written_at']), self.since, self.after, self.size)
+
+    def limit(self, size):
+        return _Query(self.docs, self.since, self.after, size)
+
+    def start_after(self, doc):
+        return _Query(self.docs, self.since, doc.id, self.size)
+
+    def stream(self):
+        docs = [doc for doc in self.docs if self.since is None or doc['written_at'] >= self.since]
+        if self.after is not None:
+            docs = docs[[doc['id'] for doc in docs].index(self.after) + 1:]
+        return [_Doc(doc) for doc in docs[:self.size]]
+
+def _record(doc_id, written_at, timestamp):
+    return {'id': doc_id, 'model': 'm', 'prompt': 'p', 'response': 'r', 'time_seconds': 1.0,
+            'timestamp': timestamp, 'date': '2026-10-18', 'run_id': 'run', 'written_at': written_at}
+
+def test_sync_picks_up_documents_committed_late_or_with_other_clocks(tmp_path):
+    store = FirestoreRecordStore(str(tmp_path / 'mirror.sqlite'))
+    now = datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)
+    docs = [_record('a', now, '2026-10-18T12:00:00')]
+    assert store.sync(client=_Query(docs)) == 1
+
+    # Created earlier by a writer in another timezone, committed just after the last sync
+    docs.append(_record('b', now + timedelta(seconds=1), '2026-10-18T03:00:00'))
+    # Committed slightly before the newest mirrored document but only visible now
+    docs.append(_record('c', now - timedelta(seconds=5), '2026-10-18T11:59:00'))
+    store.sync(client=_Query(docs))
+    assert store.count() == 3
+    assert store.mirror.last_written_at() == (now + timedelta(seconds=1)).isoformat()
@@ -0,0 +1,235 @@
+import atexit
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+TRACE_DIR = 'data/traces'
+
+# Comma-separated exporters: 'file' appends spans as JSON lines under TRACE_DIR,
+# 'otel' also hands them to the OpenTelemetry API (configure an SDK and
+# exporter, e.g. with opentelemetry-instrument); 'off' disables tracing
+TRACE_EXPORT = {name.strip() for name in os.environ.get("LLM_TRACE_EXPORT", "file").split(",")} - {""}
+
+SERVICE_NAME = "llm-comparison"
+
+# Seconds between writes of buffered spans to the trace file
+FLUSH_INTERVAL_SECONDS = 2.0
+
+# Trace files older than this are deleted when a process starts tracing
+TRACE_RETENTION_DAYS = 7
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+# The run this process is working on; a worker runs one job at a time, and
+# its sweep runs on another thread, so this is process-wide rather than a contextvar
+_run_id = None
+
+_buffer = []
+_counters = {}
+_lock = threading.Lock()
+_flusher = None
+_otel_tracer = None
+
+def set_run(run_id):
+    """Attribute spans and counters recorded from now on to a run (None for app activity)"""
+    global _run_id
+    flush()
+    _run_id = run_id
+
+def _new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_forever, name="trace-flusher", daemon=True)
+        _flusher.start()
+    atexit.register(flush)
+    _prune_trace_files()
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL_SECONDS)
+        flush()
+
+def _trace_file(root=TRACE_DIR):
+    return os.path.join(root, f"spans-{datetime.now().strftime('%Y%m%d')}-{os.getpid()}.jsonl")
+
+def flush(root=TRACE_DIR):
+    """Write buffered spans and counter increments to this process's trace file"""
+    with _lock:
+        records = _buffer[:]
+        _buffer.clear()
+        now = time.time_ns()
+        for (run_id, name), value in _counters.items():
+            records.append({'kind': 'counter', 'name': name, 'value': value, 'run_id': run_id, 'time_unix_nano': now})
+        _counters.clear()
+    if not records or 'file' not in TRACE_EXPORT:
+        return
+    os.makedirs(root, exist_ok=True)
+    with open(_trace_file(root), 'a') as f:
+        f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+
+def _prune_trace_files(root=TRACE_DIR):
+    if not os.path.isdir(root):
+        return
+    cutoff = (datetime.now() - timedelta(days=TRACE_RETENTION_DAYS)).timestamp()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            # Another process pruned it first
+            pass
+
+def _otel():
+    global _otel_tracer
+    if _otel_tracer is None:
+        from opentelemetry import trace
+        _otel_tracer = trace.get_tracer(SERVICE_NAME)
+    return _otel_tracer
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block as a span; yields its attribute dict, which the block may add to.
+
+    Spans nest through a contextvar, so concurrent asyncio tasks each keep
+    their own parent. An exception marks the span as an error and propagates.
+    """
+    if not TRACE_EXPORT or 'off' in TRACE_EXPORT:
+        yield attributes
+        return
+    if _flusher is None:
+        _start_flusher()
+    parent = _current_span.get()
+    record = {
+        'kind': 'span',
+        'name': name,
+        'trace_id': parent['trace_id'] if parent else _new_id(128),
+        'span_id': _new_id(64),
+        'parent_span_id': parent['span_id'] if parent else None,
+        'run_id': _run_id,
+        'pid': os.getpid(),
+    }
+    token = _current_span.set(record)
+    otel_span = _otel().start_span(name) if 'otel' in TRACE_EXPORT else None
+    status = 'OK'
+    start_wall = time.time_ns()
+    start = time.perf_counter_ns()
+    try:
+        yield attributes
+    except BaseException as e:
+        status = 'ERROR'
+        attributes.setdefault('error', type(e).__name__)
+        raise
+    finally:
+        duration = time.perf_counter_ns() - start
+        _current_span.reset(token)
+        record.update(
+            start_time_unix_nano=start_wall,
+            end_time_unix_nano=start_wall + duration,
+            duration_ms=duration / 1e6,
+            status=status,
+            attributes=attributes,
+        )
+        with _lock:
+            _buffer.append(record)
+        if otel_span is not None:
+            otel_span.set_attributes({
+                key: value for key, value in {**attributes, 'run_id': _run_id}.items()
+                if isinstance(value, (str, bool, int, float))
+            })
+            if status == 'ERROR':
+                from opentelemetry.trace import Status, StatusCode
+                otel_span.set_status(Status(StatusCode.ERROR))
+            otel_span.end(end_time=start_wall + duration)
+
+def traced(name=None):
+    """Decorator recording each call of a function (sync or async) as a span"""
+    def decorate(function):
+        span_name = name or function.__name__
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, value=1):
+    """Add to a counter for the current run; increments are aggregated until the next flush"""
+    if not TRACE_EXPORT or 'off' in TRACE_EXPORT or not value:
+        return
+    if _flusher is None:
+        _start_flusher()
+    key = (_run_id, name)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def trace_files(root=TRACE_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(os.path.join(root, name) for name in os.listdir(root) if name.endswith('.jsonl'))
+
+def traces_version(root=TRACE_DIR):
+    """Fingerprint of the trace files; changes whenever any process flushes"""
+    entries = []
+    for path in trace_files(root):
+        stat = os.stat(path)
+        entries.append((path, stat.st_size, stat.st_mtime_ns))
+    return hashlib.sha1(repr(entries).encode()).hexdigest()
+
+def read_trace_records(root=TRACE_DIR):
+    """(spans, counters) from every trace file, as lists of dicts"""
+    spans, counters = [], []
+    for path in trace_files(root):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a killed process
+                    continue
+                (spans if record.get('kind') == 'span' else counters).append(record)
+    return spans, counters
+
+def stage_summary(spans):
+    """Per-stage call counts, errors and durations of a list of spans, largest total first.
+
+    self_s excludes time spent in child spans, so nested stages aren't counted twice.
+    """
+    import pandas as pd
+    df = pd.DataFrame(spans)
+    child_ms = df.groupby('parent_span_id')['duration_ms'].sum()
+    df['self_ms'] = (df['duration_ms'] - df['span_id'].map(child_ms).fillna(0)).clip(lower=0)
+    # Calls that return their failure (like model calls) record it as an error_type attribute
+    df['is_error'] = (df['status'] == 'ERROR') | df['attributes'].map(lambda attributes: bool((attributes or {}).get('error_type')))
+    grouped = df.groupby('name')
+    summary = pd.DataFrame({
+        'calls': grouped.size(),
+        'errors': grouped['is_error'].sum(),
+        'total_s': grouped['duration_ms'].sum() / 1000,
+        'self_s': grouped['self_ms'].sum() / 1000,
+        'mean_ms': grouped['duration_ms'].mean(),
+        'p50_ms': grouped['duration_ms'].median(),
+        'p95_ms': grouped['duration_ms'].quantile(0.95),
+        'max_ms': grouped['duration_ms'].max(),
+    })
+    return summary.sort_values('total_s', ascending=False).reset_index()
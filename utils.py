@@ -1,65 +1,309 @@
 import os
+import time
+import asyncio
+import importlib
+import threading
 import streamlit as st
-import uuid
-import pandas as pd
 from datetime import datetime
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_xai import ChatXAI
-from langchain_huggingface import HuggingFaceEndpoint
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage
+from rate_limit import (
+    EXPECTED_OUTPUT_TOKENS,
+    MAX_RETRIES,
+    RETRYABLE_ERRORS,
+    backoff_delay,
+    classify_error,
+    estimate_tokens,
+    retry_after_seconds
+)
+from hedging import DEFAULT_DEADLINE_SECONDS, latencies
+from tracing import count, span, traced
+
+# Provider SDKs, langchain_core and pyarrow are imported on first use rather
+# than here: every page imports utils, and those imports dominate cold start.
 
 PROMPT_FILE = 'data/prompts.csv'
+# Legacy CSV results, imported into result_store on first load
 RESULT_FILE = 'data/results.csv'
 
+# Display name -> (provider, LangChain module, chat model class, provider-side model id)
+MODEL_REGISTRY = {
+    "gpt-4o-mini": ("openai", "langchain_openai", "ChatOpenAI", "gpt-4o-mini"),
+    "claude-sonnet": ("anthropic", "langchain_anthropic", "ChatAnthropic", "claude-3-5-sonnet-20240620"),
+    "gemini-1.5-pro": ("google", "langchain_google_genai", "ChatGoogleGenerativeAI", "gemini-1.5-pro"),
+    "grok-2-latest": ("xai", "langchain_xai", "ChatXAI", "grok-2-latest"),
+    "llama": ("groq", "langchain_groq", "ChatGroq", "llama-3.3-70b-versatile"),
+    "deepseek": ("groq", "langchain_groq", "ChatGroq", "deepseek-r1-distill-llama-70b"),
+}
+
+# Provider -> (environment variable read by the SDK, Streamlit secret holding it)
+PROVIDER_API_KEYS = {
+    "openai": ("OPENAI_API_KEY", "OPENAI_API_KEY"),
+    "anthropic": ("ANTHROPIC_API_KEY", "ANTHROPIC_API_KEY"),
+    "google": ("GOOGLE_API_KEY", "GEMINI_API_KEY"),
+    "xai": ("XAI_API_KEY", "XAI_API_KEY"),
+    "groq": ("GROQ_API_KEY", "GROQ_API_KEY"),
+}
+
+# Provider-side model id behind each display name
+MODEL_IDS = {name: entry[3] for name, entry in MODEL_REGISTRY.items()}
+
+# Provider each model is served by; models sharing a provider share its request limits
+MODEL_PROVIDERS = {name: entry[0] for name, entry in MODEL_REGISTRY.items()}
+
+# Providers whose chat API returns several completions of one prompt per request (n > 1)
+MULTI_SAMPLE_PROVIDERS = {"openai", "xai"}
+
+# Clients are shared by every session and job in the process
+_model_clients = {}
+_model_clients_lock = threading.Lock()
+
 def get_current_date():
     return datetime.now().strftime("%Y-%m-%d")
 
-def initialize_models():
-    os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
-    os.environ["ANTHROPIC_API_KEY"] = st.secrets["ANTHROPIC_API_KEY"]
-    os.environ["GOOGLE_API_KEY"] = st.secrets["GEMINI_API_KEY"]
-    os.environ["XAI_API_KEY"] = st.secrets["XAI_API_KEY"]
-    os.environ["HUGGINGFACEHUB_API_TOKEN"] = st.secrets["HF_TOKEN"]
-    os.environ["GROQ_API_KEY"] = st.secrets["GROQ_API_KEY"]
-
-    models = {
-        "gpt-4o-mini": ChatOpenAI(model="gpt-4o-mini"),
-        "claude-sonnet": ChatAnthropic(model="claude-3-5-sonnet-20240620"),
-        "gemini-1.5-pro": ChatGoogleGenerativeAI(model="gemini-1.5-pro"),
-        "grok-2-latest": ChatXAI(model="grok-2-latest"),
-        "llama": ChatGroq(model="llama-3.3-70b-versatile"),
-        "deepseek": ChatGroq(model="deepseek-r1-distill-llama-70b"),
-    }
-    return models
+def get_model(model_name):
+    """Return the process-wide client for a model, importing its SDK and building it on first use"""
+    with _model_clients_lock:
+        if model_name not in _model_clients:
+            provider, module_name, class_name, model_id = MODEL_REGISTRY[model_name]
+            env_var, secret_name = PROVIDER_API_KEYS[provider]
+            if not os.environ.get(env_var):
+                os.environ[env_var] = st.secrets[secret_name]
+            model_class = getattr(importlib.import_module(module_name), class_name)
+            _model_clients[model_name] = model_class(model=model_id)
+        return _model_clients[model_name]
+
+def initialize_models(model_names=None):
+    """Clients for the given models (all registered models by default)"""
+    return {name: get_model(name) for name in (model_names or MODEL_REGISTRY)}
 
-def apply_model(model, user_input):
+def _used_tokens(response):
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+def _output_tokens(response, content):
+    usage = getattr(response, "usage_metadata", None) or {}
+    # Fall back to a character-based estimate when the provider reports no usage
+    return usage.get("output_tokens") or estimate_tokens(content)
+
+async def _stream_model(model, messages, start_time, on_chunk=None):
+    """Consume model.astream, returning (merged message, time to first token)"""
+    full = None
+    first_token_time = None
+    async for chunk in model.astream(messages):
+        if first_token_time is None and chunk.content:
+            first_token_time = time.perf_counter() - start_time
+        full = chunk if full is None else full + chunk
+        if on_chunk is not None and chunk.content:
+            on_chunk(full.content)
+    return full, first_token_time
+
+def _model_id(model):
+    return getattr(model, "model_name", None) or getattr(model, "model", None)
+
+async def _attempt(call, estimated, limiter=None, deadline=None, started=None):
+    """Send one request under the limiter and deadline; returns (value, elapsed seconds, error, error_type).
+
+    call(start_time) returns (value, tokens used). started, if given, is set
+    once the limiter admits the request.
+    """
+    if limiter is not None:
+        with span("rate_limit_wait"):
+            await limiter.acquire(estimated)
+    if started is not None:
+        started.set()
+    error_type = None
+    start_time = time.perf_counter()
     try:
-        start_time = datetime.now().timestamp()
-        user_message = HumanMessage(content=f"{user_input}")
-        messages = [user_message]
-        response = model.invoke(messages)
-        end_time = datetime.now().timestamp()
-        elapsed_time = end_time - start_time
-        return response.content, elapsed_time
+        try:
+            value, used = await asyncio.wait_for(call(start_time), deadline)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No response within the {deadline:g}s deadline") from None
+        if limiter is not None and used:
+            limiter.tokens.adjust(used - estimated)
+        return value, time.perf_counter() - start_time, None, None
+    except asyncio.CancelledError:
+        # The losing request of a hedge: neither a success nor a failure for the limiter
+        error_type = "cancelled"
+        raise
     except Exception as e:
-        return f"Error: {e}", 0
+        error_type = classify_error(e)
+        return None, time.perf_counter() - start_time, e, error_type
+    finally:
+        if limiter is not None:
+            await limiter.release(error_type)
+
+async def _hedged_attempt(call, estimated, limiter, deadline, hedge_after):
+    """Run one attempt, sending a duplicate if it is still running hedge_after seconds after it was sent.
 
-def save_results(result_df):
-    if result_df is not None and not result_df.empty:
-        if os.path.exists(RESULT_FILE):
-            result_df.to_csv(RESULT_FILE, mode='a', index=False, header=False)
+    The first successful response wins and the other request is cancelled;
+    if both fail, the later failure is returned. Returns (value, elapsed
+    seconds from the first request, error, error_type, hedged).
+    """
+    if hedge_after is None:
+        return (*await _attempt(call, estimated, limiter, deadline), False)
+
+    started = asyncio.Event()
+    tasks = [asyncio.ensure_future(_attempt(call, estimated, limiter, deadline, started))]
+    try:
+        await started.wait()
+        sent = time.perf_counter()
+        await asyncio.wait(tasks, timeout=hedge_after)
+        if not tasks[0].done():
+            count("hedges")
+            tasks.append(asyncio.ensure_future(_attempt(call, estimated, limiter, deadline)))
+        pending = set(tasks)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            results = [task.result() for task in done]
+            winner = next((result for result in results if result[2] is None), None)
+            if winner is not None or not pending:
+                value, _, error, error_type = winner or results[-1]
+                return value, time.perf_counter() - sent, error, error_type, len(tasks) > 1
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def _call_with_retries(call, estimated, limiter=None, deadline=None, hedge_after=None):
+    """Await call(start_time) under the limiter, retrying transient failures with jittered exponential backoff.
+
+    call returns (value, tokens used). Each attempt is abandoned as a timeout
+    after deadline seconds and, with hedge_after, hedged (see _hedged_attempt).
+    Returns (value, attempts, elapsed seconds, error, error_type, hedged);
+    value is None and error is set when every attempt failed.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        value, elapsed_time, error, error_type, hedged = await _hedged_attempt(
+            call, estimated, limiter, deadline, hedge_after
+        )
+        if error is None:
+            return value, attempt + 1, elapsed_time, None, None, hedged
+        if error_type not in RETRYABLE_ERRORS or attempt == MAX_RETRIES:
+            break
+        count("retries")
+        with span("retry_backoff", error_type=error_type):
+            await asyncio.sleep(backoff_delay(attempt, retry_after_seconds(error)))
+    return None, attempt + 1, elapsed_time, error, error_type, hedged
+
+def _outcome(content, elapsed_time, attempts, ttft, output_tokens, hedged=False):
+    generation_time = elapsed_time - (ttft or 0)
+    return {
+        'response': content,
+        'time_seconds': elapsed_time,
+        'error_type': None,
+        'attempts': attempts,
+        'ttft_seconds': ttft,
+        'output_tokens': output_tokens,
+        'tokens_per_second': output_tokens / generation_time if generation_time > 0 else None,
+        'hedged': hedged
+    }
+
+def _error_outcome(error, error_type, elapsed_time, attempts, hedged=False):
+    return {
+        'response': f"Error: {error}",
+        'time_seconds': elapsed_time,
+        'error_type': error_type,
+        'attempts': attempts,
+        'ttft_seconds': None,
+        'output_tokens': None,
+        'tokens_per_second': None,
+        'hedged': hedged
+    }
+
+async def apply_model_async(model, user_input, limiter=None, stream=False, on_chunk=None,
+                            deadline=DEFAULT_DEADLINE_SECONDS, hedge=False):
+    """Call a model, retrying transient failures with jittered exponential backoff.
+
+    Returns a dict with response, time_seconds, error_type (None on success),
+    attempts, ttft_seconds, output_tokens, tokens_per_second and hedged. Timings
+    use a monotonic clock and cover only the final attempt. With stream=True the
+    response is consumed via astream, time-to-first-token is recorded and
+    on_chunk(text_so_far) is called as content arrives.
+    Each attempt times out after deadline seconds. With hedge=True an attempt
+    slower than the model's recent HEDGE_PERCENTILE latency is duplicated and
+    the first response wins; hedged marks such results, whose time_seconds
+    runs from the first request.
+    """
+    from langchain_core.messages import HumanMessage
+    user_message = HumanMessage(content=f"{user_input}")
+    messages = [user_message]
+
+    async def call(start_time):
+        if stream:
+            response, ttft = await _stream_model(model, messages, start_time, on_chunk)
         else:
-            result_df.to_csv(RESULT_FILE, index=False)
+            response, ttft = await model.ainvoke(messages), None
+        return (response, ttft), _used_tokens(response)
 
-def load_results():
-    if os.path.exists(RESULT_FILE):
-        return pd.read_csv(RESULT_FILE)
-    return None
+    estimated = estimate_tokens(user_input) + EXPECTED_OUTPUT_TOKENS
+    latency_key = (_model_id(model), stream, 1)
+    hedge_after = latencies.hedge_delay(latency_key) if hedge else None
+    with span("apply_model", model=_model_id(model), stream=stream) as attributes:
+        value, attempts, elapsed_time, error, error_type, hedged = await _call_with_retries(
+            call, estimated, limiter, deadline, hedge_after
+        )
+        attributes.update(attempts=attempts, error_type=error_type, hedged=hedged)
+    count("model_calls")
+    if error is not None:
+        count("model_errors")
+        return _error_outcome(error, error_type, elapsed_time, attempts, hedged)
+    latencies.observe(latency_key, elapsed_time)
+    response, ttft = value
+    content = response.content if response is not None else ""
+    return _outcome(content, elapsed_time, attempts, ttft, _output_tokens(response, content), hedged)
+
+async def apply_model_samples_async(model, user_input, n, limiter=None,
+                                    deadline=DEFAULT_DEADLINE_SECONDS, hedge=False):
+    """Request n completions of one prompt in a single call via the provider's n parameter.
+
+    Returns one outcome dict (as apply_model_async) per sample. Every sample
+    shares the call's latency, attempts and hedging, and records the call's
+    sample count as samples; the call's output tokens are split between
+    samples by response length.
+    """
+    from langchain_core.messages import HumanMessage
+    messages = [HumanMessage(content=f"{user_input}")]
+
+    async def call(start_time):
+        generations = (await model.agenerate([messages], n=n)).generations[0]
+        if len(generations) < n:
+            raise ValueError(f"Requested {n} completions but received {len(generations)}")
+        return generations, _used_tokens(generations[0].message)
+
+    estimated = estimate_tokens(user_input) + EXPECTED_OUTPUT_TOKENS * n
+    latency_key = (_model_id(model), False, n)
+    hedge_after = latencies.hedge_delay(latency_key) if hedge else None
+    with span("apply_model", model=_model_id(model), samples=n) as attributes:
+        generations, attempts, elapsed_time, error, error_type, hedged = await _call_with_retries(
+            call, estimated, limiter, deadline, hedge_after
+        )
+        attributes.update(attempts=attempts, error_type=error_type, hedged=hedged)
+    count("model_calls")
+    if error is not None:
+        count("model_errors")
+        return [{**_error_outcome(error, error_type, elapsed_time, attempts, hedged), 'samples': n} for _ in range(n)]
+    latencies.observe(latency_key, elapsed_time)
+    contents = [generation.message.content for generation in generations[:n]]
+    usage = getattr(generations[0].message, "usage_metadata", None) or {}
+    total_chars = sum(len(content) for content in contents)
+    outcomes = []
+    for content in contents:
+        if usage.get("output_tokens") and total_chars:
+            output_tokens = round(usage["output_tokens"] * len(content) / total_chars)
+        else:
+            output_tokens = estimate_tokens(content)
+        outcomes.append({**_outcome(content, elapsed_time, attempts, None, output_tokens, hedged), 'samples': n})
+    return outcomes
+
+@traced()
+def load_results(dates=None, models=None, columns=None, limit=None):
+    import result_store
+    # Results saved before the columnar store existed are imported once
+    result_store.import_csv(RESULT_FILE)
+    return result_store.read_results(dates, models, columns, limit)
 
 def clear_results():
+    import result_store
+    result_store.clear()
     if os.path.exists(RESULT_FILE):
         os.remove(RESULT_FILE)
 